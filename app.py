@@ -1,13 +1,18 @@
+import glob
 import io
 import os
 import tempfile
+import threading
 from typing import List
 from datetime import datetime
 
 import pandas as pd
 import streamlit as st
 
-from pdf_parser import parse_pdf
+import metrics
+from scheduler import ParseScheduler
+from pdf_parser import document_hash
+from search_index import DEFAULT_INDEX_PATH, StatementIndex, ingest
 
 
 st.set_page_config(
@@ -15,6 +20,43 @@ st.set_page_config(
     layout="wide"
 )
 
+# Optional Prometheus endpoint for long-running deployments; started once per process.
+if os.environ.get("PARSER_METRICS_PORT"):
+    metrics.start_http_server(int(os.environ["PARSER_METRICS_PORT"]))
+
+
+@st.cache_resource
+def get_scheduler() -> ParseScheduler:
+    # One worker pool per server process, shared by every session; uploads are
+    # submitted as interactive so they go ahead of any queued bulk work.
+    workers = os.environ.get("PARSER_WORKERS")
+    return ParseScheduler(int(workers) if workers else None)
+
+
+@st.cache_resource
+def get_folder_jobs() -> dict:
+    # Background folder ingests by folder, shared by every session.
+    return {}
+
+
+def start_folder_ingest(folder: str, index_path: str) -> None:
+    # Parsing goes through the shared scheduler as bulk work, so uploads from
+    # any session keep going first while a large folder is indexed.
+    paths = sorted(glob.glob(os.path.join(folder, "*.pdf")))
+    scheduler = get_scheduler()
+    job = get_folder_jobs()[folder] = {"status": "running", "documents": len(paths)}
+
+    def run():
+        try:
+            with StatementIndex(index_path) as index:
+                job.update(ingest(index, paths, scheduler=scheduler))
+            job["status"] = "done"
+        except Exception as e:
+            job.update(status="error", error=str(e))
+
+    threading.Thread(target=run, name=f"ingest-{folder}", daemon=True).start()
+
+
 st.title("Credit Card Statement PDF Parser")
 
 st.markdown("""
@@ -33,6 +75,30 @@ st.markdown("""
     ---
 """)
 
+with st.sidebar:
+    st.subheader("Search Index")
+    use_index = st.checkbox(
+        "Add parsed statements to a local search index",
+        value=False,
+        help="Stores extracted statement text in a local SQLite file so it can be searched later"
+    )
+    index_path = st.text_input("Index file", value=DEFAULT_INDEX_PATH)
+
+    with st.expander("Index a folder in the background"):
+        folder = st.text_input("Folder of PDF statements")
+        folder_jobs = get_folder_jobs()
+        running = folder_jobs.get(folder, {}).get("status") == "running"
+        if st.button("Start indexing", disabled=not folder or running):
+            if os.path.isdir(folder):
+                start_folder_ingest(folder, index_path)
+            else:
+                st.error(f"Not a folder: {folder}")
+        for name, job in folder_jobs.items():
+            st.caption(f"{name}: {job}")
+
+    with st.expander("Parser queue"):
+        st.dataframe(pd.DataFrame(get_scheduler().stats()).T, use_container_width=True)
+
 uploaded_files = st.file_uploader(
     "Upload PDF Statements", 
     type=["pdf"], 
@@ -48,6 +114,7 @@ if uploaded_files:
     status_text = st.empty()
     
     total_files = len(uploaded_files)
+    index = StatementIndex(index_path) if use_index else None
     
     for idx, uploaded in enumerate(uploaded_files):
         status_text.text(f"Processing {idx + 1}/{total_files}: {uploaded.name}")
@@ -56,11 +123,17 @@ if uploaded_files:
         # write to temp file because pdfplumber expects a path or file-like
         tmp_path = None
         try:
+            data = uploaded.read()
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(uploaded.read())
+                tmp.write(data)
                 tmp_path = tmp.name
 
-            parsed = parse_pdf(tmp_path)
+            parsed = get_scheduler().submit(
+                tmp_path, priority="interactive", include_text=index is not None
+            ).result()
+            text = parsed.pop("text", None)
+            if index is not None:
+                index.add(document_hash(data), text, parsed, filename=uploaded.name)
             parsed["filename"] = uploaded.name
             parsed["status"] = "Success"
             results.append(parsed)
@@ -83,6 +156,8 @@ if uploaded_files:
                 except Exception:
                     pass
     
+    if index is not None:
+        index.close()
     status_text.text("Processing complete")
     progress_bar.empty()
 
@@ -176,7 +251,24 @@ if uploaded_files:
                 st.write("**Payment Due:**", row.get("payment_due_date", "Not found"))
                 st.write("**New Balance:**", row.get("new_balance", "Not found"))
 
-else:
+if os.path.exists(index_path):
+    st.markdown("---")
+    st.subheader("Search Indexed Statements")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Text to find (e.g. a merchant name)")
+    with col2:
+        last4 = st.text_input("Card last 4")
+    if query or last4:
+        with StatementIndex(index_path) as index:
+            matches = index.search(query or None, card_last4=last4 or None)
+        if matches:
+            st.dataframe(pd.DataFrame(matches).drop(columns=["doc_hash"]),
+                         use_container_width=True, hide_index=True)
+        else:
+            st.info("No indexed statements match.")
+
+if not uploaded_files:
     st.info("Upload one or more PDF credit card statements to begin processing.")
     
     # Add helpful information
@@ -193,6 +285,7 @@ else:
         - All data processing occurs locally
         - No external server communication
         - Temporary files are automatically deleted after processing
+        - Statement text is only kept if the search index option is enabled
         - User is responsible for securing exported data files
         
         ### Technical Notes:
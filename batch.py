@@ -0,0 +1,305 @@
+"""
+Batch Statement Parsing
+
+Parses many statements in a pool of worker processes. Two transports are
+available:
+
+- "naive": the parent reads every document and pickles its bytes to a worker;
+  extracted text, when requested, is pickled back in full.
+- "shm": documents on disk are memory-mapped by the worker (only the path
+  crosses the process boundary), in-memory documents are copied once into a
+  shared memory block, and workers return compact field tuples with the text
+  zlib-compressed.
+
+Both return the same records: the parsed fields plus "filename", "status" and
+"error", and "text" when include_text is set. parse_batch_columns accumulates
+the same results into a records.StatementColumns instead of a list of dicts.
+
+Every document is recorded in metrics.REGISTRY: workers time their stages
+and send the timings back with the result.
+
+Pass a scheduler.ParseScheduler to run the batch on its workers as "bulk"
+work instead of in a pool of its own, so interactive jobs on the same
+scheduler go first.
+
+Usage: python batch.py [--workers N] [--transport shm|naive] [--metrics-file parser.prom] file1.pdf ...
+"""
+
+import argparse
+import io
+import mmap
+import os
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import metrics
+from pdf_parser import FIELDS, parse_pdf_timed
+from records import StatementColumns, StatementRecord
+
+
+Source = Union[str, bytes]
+
+TRANSPORTS = ("shm", "naive")
+
+
+class _BufferStream(io.RawIOBase):
+    """Read-only, seekable file object over a memoryview, without copying it."""
+
+    def __init__(self, buf: memoryview):
+        super().__init__()
+        self._buf = buf
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = len(self._buf) + offset
+        return self._pos
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._buf) - self._pos))
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        # Release the view so the underlying shared memory can be closed.
+        if not self.closed:
+            self._buf.release()
+        super().close()
+
+
+def _parse_stream(fp, include_text: bool):
+    fields, text, timings = parse_pdf_timed(fp)
+    return fields, (text if include_text else None), timings
+
+
+def _compact(fields: dict, text: Optional[str], timings: tuple) -> tuple:
+    packed_text = zlib.compress(text.encode("utf-8"), 1) if text is not None else None
+    return tuple(fields[k] for k in FIELDS), packed_text, timings
+
+
+def _naive_worker(data: bytes, include_text: bool) -> tuple:
+    fields, text, timings = _parse_stream(io.BytesIO(data), include_text)
+    if include_text:
+        fields["text"] = text
+    return fields, timings
+
+
+def _mapped_worker(path: str, include_text: bool) -> tuple:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        fields, text, timings = _parse_stream(mm, include_text)
+    return _compact(fields, text, timings)
+
+
+def _shm_worker(name: str, size: int, include_text: bool) -> tuple:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # The block may be rounded up to a page size; only expose the document.
+        stream = _BufferStream(shm.buf[:size])
+        try:
+            fields, text, timings = _parse_stream(stream, include_text)
+        finally:
+            stream.close()
+    finally:
+        shm.close()
+    return _compact(fields, text, timings)
+
+
+def _expand(result, include_text: bool) -> Tuple[dict, tuple]:
+    if isinstance(result[0], dict):
+        return result
+    values, packed_text, timings = result
+    record = dict(zip(FIELDS, values))
+    if include_text:
+        record["text"] = zlib.decompress(packed_text).decode("utf-8")
+    return record, timings
+
+
+def _source_name(source: Source, index: int, names: Optional[Sequence[str]]) -> str:
+    if names is not None:
+        return names[index]
+    if isinstance(source, str):
+        return os.path.basename(source)
+    return f"document_{index + 1}"
+
+
+class _SchedulerPool:
+    """Executor-like view of a ParseScheduler that queues every call at one priority."""
+
+    def __init__(self, scheduler, priority: str = "bulk"):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def submit(self, fn, *args):
+        return self.scheduler.call(fn, *args, priority=self.priority)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def _run_batch(
+    sources: Sequence[Source],
+    workers: Optional[int],
+    transport: str,
+    include_text: bool,
+    scheduler=None,
+) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (index, fields, error) for every source, in input order.
+
+    At most two documents per worker are in flight at a time, which bounds the
+    shared memory held by the "shm" transport and the pickled bytes queued by
+    the "naive" one.
+    """
+    if transport not in TRANSPORTS:
+        raise ValueError(f"Unknown transport: {transport!r} (expected one of {TRANSPORTS})")
+
+    if scheduler is not None:
+        workers = scheduler.workers
+        pool = _SchedulerPool(scheduler)
+    else:
+        workers = workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers)
+    blocks = {}
+    pending = {}
+    ready = {}
+
+    def submit(executor, index):
+        source = sources[index]
+        if transport == "naive":
+            if isinstance(source, str):
+                with open(source, "rb") as f:
+                    source = f.read()
+            return executor.submit(_naive_worker, source, include_text)
+        if isinstance(source, str):
+            return executor.submit(_mapped_worker, source, include_text)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(source)))
+        shm.buf[:len(source)] = source
+        blocks[index] = shm
+        return executor.submit(_shm_worker, shm.name, len(source), include_text)
+
+    def finish(index, future):
+        try:
+            fields, timings = _expand(future.result(), include_text)
+        except Exception as e:
+            metrics.record_error(e)
+            ready[index] = (None, str(e))
+        else:
+            metrics.record_document({k: fields[k] for k in FIELDS}, *timings)
+            ready[index] = (fields, None)
+        shm = blocks.pop(index, None)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    next_index = next_yield = 0
+    try:
+        with pool as executor:
+            while next_yield < len(sources):
+                while next_index < len(sources) and len(pending) < 2 * workers:
+                    try:
+                        pending[submit(executor, next_index)] = next_index
+                    except Exception as e:
+                        metrics.record_error(e)
+                        ready[next_index] = (None, str(e))
+                    next_index += 1
+                if pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(pending.pop(future), future)
+                while next_yield in ready:
+                    fields, error = ready.pop(next_yield)
+                    yield next_yield, fields, error
+                    next_yield += 1
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+
+
+def parse_batch(
+    sources: Sequence[Source],
+    workers: Optional[int] = None,
+    transport: str = "shm",
+    include_text: bool = False,
+    names: Optional[Sequence[str]] = None,
+    scheduler=None,
+) -> List[dict]:
+    """Parse PDF paths or PDF bytes in a process pool, returning records in input order.
+
+    With a scheduler, documents are queued on its workers as "bulk" work and
+    `workers` is ignored.
+    """
+    records = []
+    for index, fields, error in _run_batch(sources, workers, transport, include_text, scheduler):
+        record = {"filename": _source_name(sources[index], index, names)}
+        if error is None:
+            record.update(fields)
+            record["status"] = "Success"
+        else:
+            record.update(dict.fromkeys(FIELDS))
+            record["status"] = "Error"
+            record["error"] = error
+        records.append(record)
+    return records
+
+
+def parse_batch_columns(
+    sources: Sequence[Source],
+    workers: Optional[int] = None,
+    transport: str = "shm",
+    names: Optional[Sequence[str]] = None,
+    columns: Optional[StatementColumns] = None,
+    scheduler=None,
+) -> StatementColumns:
+    """Like parse_batch, but accumulates typed records into a StatementColumns.
+
+    Pass an existing accumulator to append several batches to one set of columns.
+    """
+    columns = columns if columns is not None else StatementColumns()
+    for index, fields, error in _run_batch(sources, workers, transport, False, scheduler):
+        fields = fields or {}
+        fields["filename"] = _source_name(sources[index], index, names)
+        fields["status"] = "Success" if error is None else "Error"
+        fields["error"] = error
+        columns.append(StatementRecord.from_dict(fields))
+    return columns
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parse many statements in a process pool")
+    ap.add_argument("pdfs", nargs="+")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--transport", choices=TRANSPORTS, default="shm")
+    ap.add_argument("--metrics-file", help="Write Prometheus metrics for the run to this file")
+    args = ap.parse_args()
+
+    for record in parse_batch(args.pdfs, workers=args.workers, transport=args.transport):
+        if record["status"] == "Error":
+            print(f"[ERROR] {record['filename']}: {record['error']}")
+        else:
+            values = ", ".join(f"{k}={record[k]}" for k in FIELDS)
+            print(f"[OK] {record['filename']}: {values}")
+    if args.metrics_file:
+        metrics.write_textfile(args.metrics_file)
+
+
+if __name__ == "__main__":
+    main()
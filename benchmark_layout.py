@@ -0,0 +1,110 @@
+"""
+Layout Lookup Benchmark
+
+Compares field extraction with the spatial word index (spatial_index.py)
+against the regex path (extract_fields_from_text) on mock statements from
+every issuer, to show what the layout fallback costs when it has to look up
+every field. PDF parsing is done once up front and is not timed. The layout
+path is timed end to end: building the page indexes from the extracted
+words, then looking up the fields. "Speedup" compares the regex pass with
+that total (values below 1x mean the layout path is slower). Page indexes
+are built lazily, so most of their cost shows up under "Lookup".
+
+--extra-pages appends synthetic transaction pages to every statement, to show
+how both paths scale with statement length.
+
+Usage: python benchmark_layout.py [--num-each 4] [--repeat 200] [--extra-pages 0]
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from collections import defaultdict
+
+from generate_mock_statements import MockStatementGenerator
+from pdf_parser import FIELDS, extract_fields_from_text, extract_text_from_pdf
+from spatial_index import PageIndex, build_page_indexes, extract_fields_from_layout
+
+
+def transaction_page(page_no: int, rows: int = 50):
+    """Words and text for a synthetic page of transaction rows."""
+    words, lines = [], []
+    for r in range(rows):
+        top = 50.0 + 14 * r
+        cells = [(50.0, f"{(r % 12) + 1:02d}/{(r % 28) + 1:02d}/2024"),
+                 (150.0, f"MERCHANT-{page_no}-{r}"),
+                 (400.0, f"${(r * 7.31) % 500:.2f}")]
+        for x0, text in cells:
+            words.append({"text": text, "x0": x0, "x1": x0 + 5.0 * len(text), "top": top, "bottom": top + 9.0})
+        lines.append(" ".join(text for _, text in cells))
+    return words, "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark layout lookup vs. regex field extraction")
+    ap.add_argument("--num-each", type=int, default=4, help="Mock statements per issuer")
+    ap.add_argument("--repeat", type=int, default=200, help="Lookups per document")
+    ap.add_argument("--extra-pages", type=int, default=0, help="Synthetic transaction pages per statement")
+    args = ap.parse_args()
+
+    print("=" * 60)
+    print("Layout Lookup Benchmark")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            paths = MockStatementGenerator(tmp).generate_all_statements(num_each=args.num_each)
+        docs = []
+        extra = [transaction_page(i) for i in range(args.extra_pages)]
+        for path in paths:
+            indexes = build_page_indexes(path)
+            text = extract_text_from_pdf(path)
+            for words, page_text in extra:
+                indexes.append(PageIndex(words))
+                text += "\n" + page_text
+            docs.append((path, text, indexes))
+
+    by_issuer = defaultdict(lambda: {"docs": 0, "regex": 0.0, "layout": 0.0, "build": 0.0, "agree": 0})
+    for path, text, indexes in docs:
+        issuer = path.rsplit("/", 1)[-1].rsplit("_statement", 1)[0]
+        row = by_issuer[issuer]
+        row["docs"] += 1
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            regex_fields = extract_fields_from_text(text)
+        row["regex"] += (time.perf_counter() - start) / args.repeat
+
+        # Fresh indexes every repetition, so lazily built structures are
+        # paid for each time, as they are for a newly parsed document.
+        words = [index.words for index in indexes]
+        build = lookup = 0.0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fresh = [PageIndex(page_words) for page_words in words]
+            built = time.perf_counter()
+            layout_fields = extract_fields_from_layout(fresh)
+            build += built - start
+            lookup += time.perf_counter() - built
+        row["build"] += build / args.repeat
+        row["layout"] += lookup / args.repeat
+
+        row["agree"] += sum(1 for k in FIELDS if regex_fields[k] == layout_fields[k])
+
+    print(f"\n{'Issuer':14s} {'Docs':>5s} {'Regex us':>10s} {'Build us':>10s} {'Lookup us':>10s} "
+          f"{'Layout us':>10s} {'Speedup':>8s} {'Agree':>7s}")
+    for issuer, row in sorted(by_issuer.items()):
+        n = row["docs"]
+        regex_us = 1e6 * row["regex"] / n
+        lookup_us = 1e6 * row["layout"] / n
+        build_us = 1e6 * row["build"] / n
+        total_us = build_us + lookup_us
+        agree = 100.0 * row["agree"] / (n * len(FIELDS))
+        print(f"{issuer:14s} {n:5d} {regex_us:10.1f} {build_us:10.1f} {lookup_us:10.1f} "
+              f"{total_us:10.1f} {regex_us / total_us:7.2f}x {agree:6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Regex Stress Benchmark
+
+Runs extract_fields_from_text over multi-megabyte adversarial text (long runs of
+asterisks, x's, digits and whitespace, unterminated 'From ... to' ranges,
+whitespace runs after 'From' and OCR-like noise) and fails if any single
+document exceeds the time budget.
+This guards the bounded-quantifier rule set in pdf_parser.py against
+patterns that backtrack super-linearly.
+
+Usage: python benchmark_regex.py [--size-mb 4] [--budget 5.0]
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+
+from pdf_parser import extract_fields_from_text
+
+
+STATEMENT_TAIL = (
+    "Chase\n"
+    "Account holder: Jane Smith\n"
+    "Account ending in 4321\n"
+    "Statement period: 01/01/2024 - 01/31/2024\n"
+    "Payment due date: 02/25/2024\n"
+    "New balance: $1,234.56\n"
+)
+
+EXPECTED_TAIL_FIELDS = {
+    "card_last4": "4321",
+    "payment_due_date": "2024-02-25",
+    "new_balance": "$1,234.56",
+}
+
+
+def ocr_noise(size: int, seed: int = 0) -> str:
+    """Random characters drawn from the classes the field captures accept."""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + " ,./-:$*\n"
+    return "".join(rng.choice(alphabet) for _ in range(size))
+
+
+def adversarial_documents(size: int):
+    """Yield (name, text) pairs of roughly `size` characters each."""
+    yield "asterisk run", "*" * size
+    yield "x run", "x" * size
+    yield "digit/comma run", "1," * (size // 2)
+    yield "whitespace after labels", ("New balance:" + " " * 2000 + "\n") * (size // 2012)
+    yield "unterminated From", "From " + "ab 12, " * (size // 7)
+    yield "repeated From", "From abc def " * (size // 13)
+    yield "whitespace after From", ("From" + " " * 60) * (size // 64)
+    yield "label without value", ("Statement period:" + " " * 500 + "\n") * (size // 517)
+    yield "name label run", "Cardholder " + "A" * size
+    yield "ocr noise", ocr_noise(size)
+    # Real statement text after the noise must still be found.
+    yield "noise + statement", ocr_noise(size, seed=1).replace("\n", " ") + "\n" + STATEMENT_TAIL
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stress-test field regexes on adversarial text")
+    ap.add_argument("--size-mb", type=float, default=4.0, help="Size of each document in MB")
+    ap.add_argument("--budget", type=float, default=5.0, help="Max seconds per document")
+    args = ap.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+
+    print("=" * 60)
+    print("Regex Stress Benchmark")
+    print("=" * 60)
+    print(f"Document size: {args.size_mb:.1f} MB, budget: {args.budget:.2f}s per document\n")
+
+    failures = []
+    for name, text in adversarial_documents(size):
+        start = time.perf_counter()
+        fields = extract_fields_from_text(text)
+        elapsed = time.perf_counter() - start
+
+        ok = elapsed <= args.budget
+        if name == "noise + statement":
+            wrong = {k: fields[k] for k, v in EXPECTED_TAIL_FIELDS.items() if fields[k] != v}
+            if wrong:
+                ok = False
+                name = f"{name} (wrong fields: {wrong})"
+        if not ok:
+            failures.append(name)
+        print(f"[{'OK' if ok else 'FAIL':4s}] {name:28s} {len(text) / 1e6:6.2f} MB  {elapsed:7.3f}s")
+
+    print("\n" + "=" * 60)
+    if failures:
+        print(f"FAILED: {len(failures)} document(s) over budget or misparsed")
+        sys.exit(1)
+    print("SUCCESS: all documents within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
 from reportlab.pdfgen import canvas
+import io
 import random
 from datetime import datetime, timedelta
 import os
@@ -44,11 +45,25 @@ class MockStatementGenerator:
     ]
     
     def __init__(self, output_dir='mock_statements'):
-        """Initialize the generator."""
+        """Initialize the generator. Pass output_dir=None to only render in memory."""
         self.output_dir = output_dir
-        if not os.path.exists(output_dir):
+        if output_dir is not None and not os.path.exists(output_dir):
             os.makedirs(output_dir)
     
+    def _target(self, filename):
+        """Canvas target: a file-like object as-is, otherwise a path in output_dir."""
+        if hasattr(filename, 'write'):
+            return filename
+        return os.path.join(self.output_dir, filename)
+    
+    def render_statement(self, issuer):
+        """Render one statement for an ISSUERS key (e.g. 'chase') into PDF bytes."""
+        if issuer not in self.ISSUERS:
+            raise ValueError(f"Unknown issuer: {issuer}")
+        buffer = io.BytesIO()
+        getattr(self, f"generate_{issuer}_statement")(buffer)
+        return buffer.getvalue()
+    
     def generate_transactions(self, num_transactions=15):
         """Generate random transactions."""
         transactions = []
@@ -68,7 +83,7 @@ class MockStatementGenerator:
     
     def generate_chase_statement(self, filename='chase_statement.pdf'):
         """Generate a Chase-style statement."""
-        filepath = os.path.join(self.output_dir, filename)
+        filepath = self._target(filename)
         c = canvas.Canvas(filepath, pagesize=letter)
         width, height = letter
         
@@ -133,7 +148,7 @@ class MockStatementGenerator:
     
     def generate_bofa_statement(self, filename='bofa_statement.pdf'):
         """Generate a Bank of America-style statement."""
-        filepath = os.path.join(self.output_dir, filename)
+        filepath = self._target(filename)
         c = canvas.Canvas(filepath, pagesize=letter)
         width, height = letter
         
@@ -200,7 +215,7 @@ class MockStatementGenerator:
     
     def generate_citi_statement(self, filename='citi_statement.pdf'):
         """Generate a Citi-style statement."""
-        filepath = os.path.join(self.output_dir, filename)
+        filepath = self._target(filename)
         c = canvas.Canvas(filepath, pagesize=letter)
         width, height = letter
         
@@ -261,7 +276,7 @@ class MockStatementGenerator:
     
     def generate_amex_statement(self, filename='amex_statement.pdf'):
         """Generate an American Express-style statement."""
-        filepath = os.path.join(self.output_dir, filename)
+        filepath = self._target(filename)
         c = canvas.Canvas(filepath, pagesize=letter)
         width, height = letter
         
@@ -320,7 +335,7 @@ class MockStatementGenerator:
     
     def generate_capital_one_statement(self, filename='capital_one_statement.pdf'):
         """Generate a Capital One-style statement."""
-        filepath = os.path.join(self.output_dir, filename)
+        filepath = self._target(filename)
         c = canvas.Canvas(filepath, pagesize=letter)
         width, height = letter
         
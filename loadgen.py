@@ -0,0 +1,240 @@
+"""
+Open-Loop Load Generator
+
+Renders mock statements into memory (no disk I/O) and drives the parser at a
+target rate of documents per second, stepping the rate up to find the
+saturation point of a deployment.
+
+Requests are scheduled open-loop: request i is due at step_start + i / rate
+(or at Poisson arrival times with --poisson) and is sent at that time no
+matter how many earlier requests are still outstanding. Latency is measured
+from the scheduled time, not from when the request was actually sent, so
+delays caused by a backed-up sender are counted (coordinated-omission
+correction). Service time is reported alongside. It is measured inside the
+worker process for inproc, and around the HTTP request for URLs, so it
+excludes any local queueing.
+
+Targets:
+    inproc                 parse_pdf in a local process pool (--workers)
+    http://host:port/path  POST each PDF (Content-Type: application/pdf) to a
+                           local service entry point; any 2xx is a success
+
+Usage:
+    python loadgen.py --rates 2,4,8,16 --step-seconds 15
+    python loadgen.py --target http://127.0.0.1:8000/parse --rates 10,20,40
+"""
+
+import argparse
+import io
+import os
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from generate_mock_statements import MockStatementGenerator
+from metrics import percentile
+from pdf_parser import parse_pdf
+
+
+def _parse_bytes(data: bytes) -> Tuple[dict, float]:
+    # Timed in the worker, so pool queueing is not counted as service time.
+    start = time.perf_counter()
+    fields = parse_pdf(io.BytesIO(data))
+    return fields, time.perf_counter() - start
+
+
+def build_corpus(num_each: int = 4) -> List[bytes]:
+    """Mock statements for every issuer, rendered into memory."""
+    generator = MockStatementGenerator(output_dir=None)
+    return [generator.render_statement(issuer)
+            for _ in range(num_each) for issuer in MockStatementGenerator.ISSUERS]
+
+
+class InProcessTarget:
+    """Submits documents to parse_pdf in a local process pool."""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+
+    def submit(self, data: bytes):
+        return self.executor.submit(_parse_bytes, data)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class HttpTarget:
+    """POSTs documents to a local HTTP entry point from a thread pool."""
+
+    def __init__(self, url: str, concurrency: int = 64, timeout: float = 60.0):
+        self.url = url
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _post(self, data: bytes) -> Tuple[int, float]:
+        req = urllib.request.Request(self.url, data=data, method="POST",
+                                     headers={"Content-Type": "application/pdf"})
+        start = time.perf_counter()
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+            return resp.status, time.perf_counter() - start
+
+    def submit(self, data: bytes):
+        return self.executor.submit(self._post, data)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class StepResult:
+    """Latency and error counts for one rate step."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.sent = 0
+        self.errors = 0
+        self.latencies: List[float] = []  # from scheduled time, seconds
+        self.service_times: List[float] = []  # measured by the target, seconds
+        self.first_scheduled: Optional[float] = None
+        self.last_completion: Optional[float] = None
+        self.recorded = 0  # completions recorded so far
+        self.lock = threading.Condition()
+
+    def record(self, scheduled: float, future) -> None:
+        done = time.perf_counter()
+        error = future.exception()
+        with self.lock:
+            if error is not None:
+                self.errors += 1
+            else:
+                self.latencies.append(done - scheduled)
+                self.service_times.append(future.result()[1])
+            self.last_completion = max(done, self.last_completion or done)
+            self.recorded += 1
+            self.lock.notify_all()
+
+    def wait_recorded(self, count: int) -> None:
+        """Block until `count` completions have been recorded.
+
+        Done callbacks run after threads blocked in future.result() are woken,
+        so draining the futures alone does not mean every result is recorded.
+        """
+        with self.lock:
+            self.lock.wait_for(lambda: self.recorded >= count)
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        service = sorted(self.service_times)
+        completed = len(latencies)
+        elapsed = (self.last_completion - self.first_scheduled
+                   if self.last_completion is not None and self.first_scheduled is not None else 0.0)
+        return {
+            "rate": self.rate,
+            "sent": self.sent,
+            "completed": completed,
+            "error_rate": self.errors / self.sent if self.sent else 0.0,
+            "throughput": completed / elapsed if elapsed > 0 else 0.0,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "p999": percentile(latencies, 99.9),
+            "max": latencies[-1] if latencies else float("nan"),
+            "service_p99": percentile(service, 99),
+        }
+
+
+def run_step(submit: Callable, corpus: Sequence[bytes], rate: float, duration: float,
+             poisson: bool = False, seed: int = 0) -> StepResult:
+    """Send requests open-loop at `rate` docs/s for `duration` seconds, then drain."""
+    rng = random.Random(seed)
+    result = StepResult(rate)
+    futures = []
+    start = time.perf_counter()
+    result.first_scheduled = start
+    scheduled = start
+    i = 0
+    while scheduled < start + duration:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            future = submit(corpus[i % len(corpus)])
+        except Exception:
+            with result.lock:
+                result.errors += 1
+        else:
+            future.add_done_callback(lambda f, s=scheduled: result.record(s, f))
+            futures.append(future)
+        result.sent += 1
+        i += 1
+        scheduled = scheduled + rng.expovariate(rate) if poisson else start + i / rate
+    result.wait_recorded(len(futures))
+    return result
+
+
+def find_saturation(summaries: List[dict], slo_ms: Optional[float]) -> Optional[dict]:
+    """First step whose throughput falls short of the offered rate or breaks the p99 SLO."""
+    for s in summaries:
+        if s["throughput"] < 0.95 * s["rate"]:
+            return s
+        if slo_ms is not None and s["p99"] * 1000 > slo_ms:
+            return s
+    return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Open-loop load generator for the statement parser")
+    ap.add_argument("--target", default="inproc", help="'inproc' or an http:// URL")
+    ap.add_argument("--rates", default="1,2,4,8", help="Comma-separated docs/s per step")
+    ap.add_argument("--step-seconds", type=float, default=10.0)
+    ap.add_argument("--workers", type=int, default=None, help="Process pool size for inproc")
+    ap.add_argument("--concurrency", type=int, default=64, help="Max in-flight HTTP requests")
+    ap.add_argument("--num-each", type=int, default=4, help="Mock statements per issuer in memory")
+    ap.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of fixed spacing")
+    ap.add_argument("--slo-ms", type=float, default=None, help="p99 latency objective in ms")
+    args = ap.parse_args()
+
+    rates = [float(r) for r in args.rates.split(",") if r.strip()]
+    corpus = build_corpus(args.num_each)
+
+    print("=" * 60)
+    print("Open-Loop Load Generator")
+    print("=" * 60)
+    print(f"Target: {args.target}, corpus: {len(corpus)} in-memory statements, "
+          f"{args.step_seconds:.0f}s per step\n")
+
+    if args.target == "inproc":
+        target = InProcessTarget(args.workers)
+        # Warm the pool so process start-up is not billed to the first step.
+        for future in [target.submit(corpus[0]) for _ in range(args.workers or os.cpu_count() or 1)]:
+            future.result()
+    else:
+        target = HttpTarget(args.target, args.concurrency)
+
+    print(f"{'Rate/s':>7s} {'Sent':>6s} {'Err%':>6s} {'Thru/s':>7s} {'p50ms':>8s} {'p90ms':>8s} "
+          f"{'p99ms':>8s} {'p99.9ms':>8s} {'maxms':>8s} {'svc p99':>8s}")
+    summaries = []
+    try:
+        for step, rate in enumerate(rates):
+            s = run_step(target.submit, corpus, rate, args.step_seconds, args.poisson, seed=step).summary()
+            summaries.append(s)
+            print(f"{s['rate']:7.1f} {s['sent']:6d} {100 * s['error_rate']:6.1f} {s['throughput']:7.2f} "
+                  f"{1000 * s['p50']:8.1f} {1000 * s['p90']:8.1f} {1000 * s['p99']:8.1f} "
+                  f"{1000 * s['p999']:8.1f} {1000 * s['max']:8.1f} {1000 * s['service_p99']:8.1f}")
+    finally:
+        target.close()
+
+    print()
+    saturated = find_saturation(summaries, args.slo_ms)
+    if saturated:
+        print(f"Saturation at {saturated['rate']:.1f} docs/s "
+              f"(throughput {saturated['throughput']:.2f}/s, p99 {1000 * saturated['p99']:.0f} ms)")
+    else:
+        print("No saturation within the tested rates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Parser Metrics
+
+In-process counters and histograms for long-running parser processes,
+exported in the Prometheus text exposition format. parse_pdf and the batch
+paths (batch.py) record into the module-level REGISTRY; recording is a dict
+update under a lock, which is negligible next to parsing a PDF, so metrics
+are always on. Nothing is exposed unless a process asks for it:
+
+    import metrics
+    metrics.start_http_server(9108)          # serves http://127.0.0.1:9108/metrics
+    metrics.write_textfile("parser.prom")    # or a node_exporter textfile
+
+Metrics recorded per parsed document:
+
+    statement_parser_documents_total{issuer, status}
+    statement_parser_stage_seconds{stage}          extract_text, extract_fields
+    statement_parser_pages_total
+    statement_parser_field_misses_total{issuer, field}
+    statement_parser_errors_total{type}
+
+and by scheduler.ParseScheduler, per priority class:
+
+    statement_parser_queue_depth{priority}
+    statement_parser_queue_wait_seconds{priority}
+
+Per-field miss rate by issuer is field_misses_total / documents_total{status="success"}.
+"""
+
+import bisect
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers a fast field pass (~1 ms) up to extracting a very long statement.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence (nan if empty)."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Optional[str]]) -> Tuple[str, ...]:
+        # None labels (e.g. an undetected issuer) are exported as "unknown".
+        return tuple("unknown" if labels.get(n) is None else str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_label_str(self.labelnames, k)} {_format_value(v)}"
+                                for k, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, such as a queue depth."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [per-bucket counts (last slot = +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+DOCUMENTS = REGISTRY.counter(
+    "statement_parser_documents_total", "Statements parsed, by detected issuer and outcome.", ("issuer", "status"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "statement_parser_stage_seconds", "Time spent per parsing stage.", ("stage",))
+PAGES = REGISTRY.counter(
+    "statement_parser_pages_total", "PDF pages whose text was extracted.")
+FIELD_MISSES = REGISTRY.counter(
+    "statement_parser_field_misses_total", "Parsed statements with no value for a field.", ("issuer", "field"))
+ERRORS = REGISTRY.counter(
+    "statement_parser_errors_total", "Statements that failed to parse, by exception type.", ("type",))
+QUEUE_DEPTH = REGISTRY.gauge(
+    "statement_parser_queue_depth", "Documents waiting in the parse scheduler, by priority class.", ("priority",))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "statement_parser_queue_wait_seconds", "Time from submission to dispatch in the parse scheduler.", ("priority",))
+
+
+def record_document(fields: dict, extract_seconds: float, fields_seconds: float, pages: int) -> None:
+    """Record one successfully parsed statement."""
+    issuer = fields.get("issuer")
+    DOCUMENTS.inc(issuer=issuer, status="success")
+    STAGE_SECONDS.observe(extract_seconds, stage="extract_text")
+    STAGE_SECONDS.observe(fields_seconds, stage="extract_fields")
+    PAGES.inc(pages)
+    for field, value in fields.items():
+        if value is None and field != "issuer":
+            FIELD_MISSES.inc(issuer=issuer, field=field)
+
+
+def record_error(error) -> None:
+    """Record a statement that failed; `error` is the exception or its type name."""
+    name = error if isinstance(error, str) else type(error).__name__
+    DOCUMENTS.inc(issuer=None, status="error")
+    ERRORS.inc(type=name)
+
+
+def write_textfile(path: str, registry: Registry = REGISTRY) -> None:
+    """Write the current metrics to `path` atomically (node_exporter textfile format)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+_servers: Dict[Tuple[str, int], ThreadingHTTPServer] = {}
+_servers_lock = threading.Lock()
+
+
+def start_http_server(port: int, addr: str = "127.0.0.1", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve metrics at http://addr:port/metrics from a daemon thread.
+
+    Calling it again for the same address returns the running server, so it is
+    safe from code that runs more than once per process (e.g. a Streamlit script).
+    """
+    with _servers_lock:
+        server = _servers.get((addr, port))
+        if server is not None:
+            return server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((addr, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name=f"metrics-{port}", daemon=True).start()
+        _servers[(addr, port)] = server
+        return server
@@ -1,22 +1,168 @@
+import hashlib
+import json
 import re
-from typing import Dict, Optional, List
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, Dict, Optional, List, Tuple, Union
 from dateutil import parser as dateparser
 import pdfplumber
 
+import metrics
+
 
 ISSUERS = ["chase", "bank of america", "citi", "american express", "capital one"]
 
+# Keys of the dict returned by extract_fields_from_text, in display order.
+FIELDS = ("issuer", "cardholder_name", "card_last4", "statement_period", "payment_due_date", "new_balance")
+
+# Rule lists per field, tried in order by first_match. Kept at module level so
+# rule_stats.RuleStats can key hit counters on them and reorder them.
+#
+# Every quantifier is bounded: label separators match at most 10 characters and
+# value captures are capped at a little more than the longest value we keep.
+# Open-ended runs such as `\*{2,}` or `[:\s]*\s*` backtrack quadratically on long
+# runs of asterisks, x's or whitespace in noisy text; with bounded windows each
+# search attempt does constant work, so a scan stays linear in the text length.
+# Where only the digits after a run are captured, the rule anchors on the end
+# of the run (`x\s{0,5}(\d{4})` rather than `x+\s*(\d{4})`): same capture, but
+# no per-position rescan of the run.
+LAST4_RULES = [
+    r"ending in\s{0,10}(\d{4})",
+    r"ending:\s{0,10}(\d{4})",
+    r"\*\*\s{0,5}(\d{4})",
+    r"(\d{4})\s{0,5}\)",
+    r"Account\s{1,10}\*{3,12}(\d{4})",
+    r"card\s{1,10}ending\s{1,10}in\s{1,10}(\d{4})",
+    r"x\s{0,5}(\d{4})",
+]
+
+NAME_RULES = [
+    r"Account holder[:\s]{0,10}([A-Z][A-Za-z\- ,\.]{0,59})",
+    r"Account summary for[:\s]{0,10}([A-Z][A-Za-z\- ,\.]{0,59})",
+    r"Statement for[:\s]{0,10}([A-Z][A-Za-z\- ,\.]{0,59})",
+    r"Cardholder[:\s]{0,10}([A-Z][A-Za-z\- ,\.]{0,59})",
+    r"Member Name[:\s]{0,10}([A-Z][A-Za-z\- ,\.]{0,59})",
+]
+
+PERIOD_RULES = [
+    r"Statement period[:\s]{0,10}([A-Za-z0-9 ,\-/]{1,120})",
+    r"Billing period[:\s]{0,10}([A-Za-z0-9 ,\-/]{1,120})",
+    r"Statement closing date[:\s]{0,10}([A-Za-z0-9 ,\-/]{1,120})",
+    r"Billing cycle[:\s]{0,10}([A-Za-z0-9 ,\-/]{1,120})",
+]
+
+DUE_RULES = [
+    r"Payment due date[:\s]{0,10}([A-Za-z0-9 ,/\-]{1,40})",
+    r"Due date[:\s]{0,10}([A-Za-z0-9 ,/\-]{1,40})",
+    r"Payment due[:\s]{0,10}([A-Za-z0-9 ,/\-]{1,40})",
+    r"Pay by[:\s]{0,10}([A-Za-z0-9 ,/\-]{1,40})",
+]
+
+BALANCE_RULES = [
+    r"New balance[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})",
+    r"New account balance[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})",
+    r"Current balance[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})",
+    r"Total balance[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})",
+    r"Amount due[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})",
+    r"Total due[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})",
+]
+
+FIELD_RULES = {
+    "card_last4": LAST4_RULES,
+    "cardholder_name": NAME_RULES,
+    "statement_period": PERIOD_RULES,
+    "payment_due_date": DUE_RULES,
+    "new_balance": BALANCE_RULES,
+}
+
+
+# Issuer-specific rules, tried only when the shared rule list for the field
+# finds nothing. Kept as data (rather than branches in the extractors) so each
+# issuer's rules are fingerprinted separately by rule_fingerprints.
+ISSUER_RULES = {
+    "chase": {
+        # Chase often shows 'Total due' or 'New balance' near the top
+        "new_balance": [r"Total due[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})", r"Amount due[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})"],
+        # Chase sometimes shows 'Statement closing date' or 'Statement period'
+        "statement_period": [r"Statement closing date[:\s]{0,10}([A-Za-z0-9 ,/\-]{1,120})", r"Statement period[:\s]{0,10}([A-Za-z0-9 ,\-/]{1,120})"],
+    },
+    "american express": {
+        # Amex uses 'Account ending in' label
+        "card_last4": [r"Account ending in[:\s]{0,10}(\d{4})"],
+        "payment_due_date": [r"Payment due[:\s]{0,10}([A-Za-z0-9 ,/\-]{1,40})", r"Due date[:\s]{0,10}([A-Za-z0-9 ,/\-]{1,40})"],
+    },
+    "bank of america": {
+        "card_last4": [r"Account number ending in[:\s]{0,10}(\d{4})"],
+    },
+    "citi": {
+        "new_balance": [r"New balance[:\s]{0,10}\$?\s{0,5}([\d,]{1,20}\.\d{2})"],
+    },
+    "capital one": {
+        "card_last4": [r"Account ending in[:\s]{0,10}(\d{4})"],
+    },
+}
+
+
+# Documents with at least this many pages are split across worker processes
+# when a caller passes workers > 1; smaller ones stay on the single-process path
+# because reopening the PDF in each worker costs more than it saves.
+PARALLEL_MIN_PAGES = 40
+
+
+def document_hash(data: bytes) -> str:
+    # content key for a PDF: the same statement under another name maps to the same key
+    return hashlib.sha256(data).hexdigest()
+
+
+def release_page(page) -> None:
+    # drop the page's cached layout objects; long statements otherwise
+    # hold every page's characters in memory until the PDF is closed.
+    # Page.close() (pdfplumber >= 0.10) also clears the text map cache.
+    if hasattr(page, "close"):
+        page.close()
+    else:
+        page.flush_cache()
+
 
-def extract_text_from_pdf(path: str) -> str:
-    texts = []
+def _page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        # fall back to empty for a page if extraction fails
+        return ""
+    finally:
+        release_page(page)
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    # pdfplumber numbers pages from 1
+    with pdfplumber.open(path, pages=list(range(start + 1, stop + 1))) as pdf:
+        return [_page_text(page) for page in pdf.pages]
+
+
+def extract_pages_from_pdf(path: Union[str, BinaryIO], workers: Optional[int] = None) -> List[str]:
     with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            try:
-                texts.append(page.extract_text() or "")
-            except Exception:
-                # fall back to empty for a page if extraction fails
-                texts.append("")
-    return "\n".join(texts)
+        page_count = len(pdf.pages)
+        # Only files on disk can be reopened by worker processes.
+        if not workers or workers <= 1 or page_count < PARALLEL_MIN_PAGES or not isinstance(path, str):
+            return [_page_text(page) for page in pdf.pages]
+
+    # Two contiguous page ranges per worker: enough to even out uneven pages
+    # without reopening the document for every few pages.
+    chunk = -(-page_count // (workers * 2))
+    starts = list(range(0, page_count, chunk))
+    stops = [min(start + chunk, page_count) for start in starts]
+    pages = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(starts))) as executor:
+        # map yields in submission order, so pages come back in document order
+        for texts in executor.map(_extract_page_range, [path] * len(starts), starts, stops):
+            pages.extend(texts)
+    return pages
+
+
+def extract_text_from_pdf(path: Union[str, BinaryIO], workers: Optional[int] = None) -> str:
+    return "\n".join(extract_pages_from_pdf(path, workers))
 
 
 def detect_issuer(text: str) -> Optional[str]:
@@ -30,11 +176,19 @@ def detect_issuer(text: str) -> Optional[str]:
     return None
 
 
-def first_match(regexes, text):
+def first_match(regexes, text, stats=None, issuer=None, field=None):
+    # stats is an optional rule_stats.RuleStats; it records which rule hit for
+    # (issuer, field) and, in adaptive mode, decides the evaluation order.
+    if stats is not None and field is not None:
+        regexes = stats.ordered(issuer, field, regexes)
     for rx in regexes:
         m = re.search(rx, text, re.IGNORECASE | re.DOTALL)
         if m:
+            if stats is not None and field is not None:
+                stats.record(issuer, field, rx)
             return m
+    if stats is not None and field is not None:
+        stats.record(issuer, field, None)
     return None
 
 
@@ -61,165 +215,181 @@ def parse_date(s: str) -> Optional[str]:
         return None
 
 
-def extract_fields_from_text(text: str) -> Dict[str, Optional[str]]:
-    # Common fallback regexes
-    res = {
-        "issuer": None,
-        "cardholder_name": None,
-        "card_last4": None,
-        "statement_period": None,
-        "payment_due_date": None,
-        "new_balance": None,
-    }
-
-    issuer = detect_issuer(text)
-    res["issuer"] = issuer
-
+def _extract_card_last4(text: str, issuer: Optional[str], stats=None) -> Optional[str]:
     # Card last 4: common patterns like 'ending in 1234' or '**** 1234' or 'Account ...1234'
-    last4_rx = [
-        r"ending in\s*(\d{4})", 
-        r"ending:\s*(\d{4})", 
-        r"\*{2,}\s*(\d{4})", 
-        r"(\d{4})\s*\)",
-        r"Account\s+\*{3,}(\d{4})",
-        r"card\s+ending\s+in\s+(\d{4})",
-        r"x+\s*(\d{4})",
-    ]
-    m = first_match(last4_rx, text)
-    if m:
-        res["card_last4"] = m.group(1)
+    m = first_match(LAST4_RULES, text, stats, issuer, "card_last4")
+    if not m:
+        m = first_match(ISSUER_RULES.get(issuer, {}).get("card_last4", []), text)
+    return m.group(1) if m else None
 
+
+def _extract_cardholder_name(text: str, issuer: Optional[str], stats=None) -> Optional[str]:
     # Cardholder name: look for 'Account holder', 'Account summary for' or line near the top before address lines
-    name_rx = [
-        r"Account holder[:\s]*([A-Z][A-Za-z\- ,\.]+)",
-        r"Account summary for[:\s]*([A-Z][A-Za-z\- ,\.]+)",
-        r"Statement for[:\s]*([A-Z][A-Za-z\- ,\.]+)",
-        r"Cardholder[:\s]*([A-Z][A-Za-z\- ,\.]+)",
-        r"Member Name[:\s]*([A-Z][A-Za-z\- ,\.]+)",
-    ]
-    m = first_match(name_rx, text)
+    m = first_match(NAME_RULES, text, stats, issuer, "cardholder_name")
     if m:
         name = m.group(1).strip()
         # Clean up common noise
         name = re.sub(r'\s+(LLC|INC|CORP|LTD).*', '', name, flags=re.IGNORECASE)
-        res["cardholder_name"] = name[:50]  # Limit length
-    else:
-        # fallback: take first line with two words and capital letters near top
-        top_lines = text.strip().splitlines()[:15]
-        for line in top_lines:
-            line = line.strip()
-            if re.match(r"^[A-Z][a-z]+\s+[A-Z][a-z]+", line) and len(line) < 50:
-                res["cardholder_name"] = line
-                break
+        return name[:50]  # Limit length
+    # fallback: take first line with two words and capital letters near top
+    top_lines = text.strip().splitlines()[:15]
+    for line in top_lines:
+        line = line.strip()
+        if re.match(r"^[A-Z][a-z]+\s+[A-Z][a-z]+", line) and len(line) < 50:
+            return line
+    return None
 
+
+def _extract_statement_period(text: str, issuer: Optional[str], stats=None) -> Optional[str]:
     # Statement period / billing cycle: common labels like 'Statement period' or 'Statement date'
-    period_rx = [
-        r"Statement period[:\s]*([A-Za-z0-9 ,\-/]+)",
-        r"Billing period[:\s]*([A-Za-z0-9 ,\-/]+)",
-        r"Statement closing date[:\s]*([A-Za-z0-9 ,\-/]+)",
-        r"Billing cycle[:\s]*([A-Za-z0-9 ,\-/]+)",
-    ]
-    m = first_match(period_rx, text)
+    m = first_match(PERIOD_RULES, text, stats, issuer, "statement_period")
     if m:
-        res["statement_period"] = m.group(1).strip()[:100]
-    else:
-        # try to capture 'From <date> to <date>' or '<date> - <date>'
-        m = re.search(r"From\s+([A-Za-z0-9,\s]+?)\s+to\s+([A-Za-z0-9,\s]+?)\b", text, re.IGNORECASE)
-        if m:
-            res["statement_period"] = f"{m.group(1).strip()} to {m.group(2).strip()}"
-        else:
-            m = re.search(r"(\d{1,2}/\d{1,2}/\d{2,4})\s*-\s*(\d{1,2}/\d{1,2}/\d{2,4})", text)
-            if m:
-                res["statement_period"] = f"{m.group(1)} to {m.group(2)}"
-
-    # Payment due date
-    due_rx = [
-        r"Payment due date[:\s]*([A-Za-z0-9 ,/\-]+)",
-        r"Due date[:\s]*([A-Za-z0-9 ,/\-]+)",
-        r"Payment due[:\s]*([A-Za-z0-9 ,/\-]+)",
-        r"Pay by[:\s]*([A-Za-z0-9 ,/\-]+)",
-    ]
-    m = first_match(due_rx, text)
+        return m.group(1).strip()[:100]
+    # try to capture 'From <date> to <date>' or '<date> - <date>'
+    # Each date starts (and the first also ends) on a non-space, so the
+    # captures cannot trade characters with the \s{1,10} around them: on a long
+    # run of whitespace after 'From' every attempt fails at its first character.
+    m = re.search(r"From\s{1,10}([A-Za-z0-9,](?:[A-Za-z0-9,\s]{0,38}?[A-Za-z0-9,])??)\s{1,10}"
+                  r"to\s{1,10}([A-Za-z0-9,][A-Za-z0-9,\s]{0,39}?)\b", text, re.IGNORECASE)
     if m:
-        res["payment_due_date"] = parse_date(m.group(1))
-
-    # New balance / Total balance
-    balance_rx = [
-        r"New balance[:\s]*\$?\s*([\d,]+\.\d{2})",
-        r"New account balance[:\s]*\$?\s*([\d,]+\.\d{2})",
-        r"Current balance[:\s]*\$?\s*([\d,]+\.\d{2})",
-        r"Total balance[:\s]*\$?\s*([\d,]+\.\d{2})",
-        r"Amount due[:\s]*\$?\s*([\d,]+\.\d{2})",
-        r"Total due[:\s]*\$?\s*([\d,]+\.\d{2})",
-    ]
-    m = first_match(balance_rx, text)
+        return f"{m.group(1).strip()} to {m.group(2).strip()}"
+    m = re.search(r"(\d{1,2}/\d{1,2}/\d{2,4})\s{0,5}-\s{0,5}(\d{1,2}/\d{1,2}/\d{2,4})", text)
     if m:
-        res["new_balance"] = f"${m.group(1)}"
+        return f"{m.group(1)} to {m.group(2)}"
+    m = first_match(ISSUER_RULES.get(issuer, {}).get("statement_period", []), text)
+    return m.group(1).strip() if m else None
 
-    # Issuer-specific tweaks
-    if issuer == "chase":
-        # Chase often shows 'Total due' or 'New balance' near the top
-        if not res["new_balance"]:
-            m = first_match([r"Total due[:\s]*\$?\s*([\d,]+\.\d{2})", r"Amount due[:\s]*\$?\s*([\d,]+\.\d{2})"], text)
-            if m:
-                res["new_balance"] = f"${m.group(1)}"
-        # Chase sometimes shows 'Statement closing date' or 'Statement period'
-        if not res["statement_period"]:
-            m = first_match([r"Statement closing date[:\s]*([A-Za-z0-9 ,/\-]+)", r"Statement period[:\s]*([A-Za-z0-9 ,\-/]+)"], text)
-            if m:
-                res["statement_period"] = m.group(1).strip()
 
-    elif issuer == "american express":
-        # Amex uses 'Account ending in' label
-        if not res["card_last4"]:
-            m = re.search(r"Account ending in[:\s]*(\d{4})", text, re.IGNORECASE)
-            if m:
-                res["card_last4"] = m.group(1)
-        if not res["payment_due_date"]:
-            m = first_match([r"Payment due[:\s]*([A-Za-z0-9 ,/\-]+)", r"Due date[:\s]*([A-Za-z0-9 ,/\-]+)"], text)
-            if m:
-                res["payment_due_date"] = parse_date(m.group(1))
-    
-    elif issuer == "bank of america":
-        # BoA specific patterns
-        if not res["card_last4"]:
-            m = re.search(r"Account number ending in[:\s]*(\d{4})", text, re.IGNORECASE)
-            if m:
-                res["card_last4"] = m.group(1)
-    
-    elif issuer == "citi":
-        # Citi specific patterns
-        if not res["new_balance"]:
-            m = first_match([r"New balance[:\s]*\$?\s*([\d,]+\.\d{2})"], text)
-            if m:
-                res["new_balance"] = f"${m.group(1)}"
-    
-    elif issuer == "capital one":
-        # Capital One specific patterns
-        if not res["card_last4"]:
-            m = re.search(r"Account ending in[:\s]*(\d{4})", text, re.IGNORECASE)
-            if m:
-                res["card_last4"] = m.group(1)
-
-    # Generic fallback parsing for dates and balances if not found
-    if not res["payment_due_date"]:
+def _extract_payment_due_date(text: str, issuer: Optional[str], stats=None) -> Optional[str]:
+    due = None
+    m = first_match(DUE_RULES, text, stats, issuer, "payment_due_date")
+    if m:
+        due = parse_date(m.group(1))
+    if not due:
+        m = first_match(ISSUER_RULES.get(issuer, {}).get("payment_due_date", []), text)
+        if m:
+            due = parse_date(m.group(1))
+    if not due:
         # find first plausible date labeled near 'Due'
-        m = re.search(r"Due[:\s]*([A-Za-z0-9,\-/]+)", text, re.IGNORECASE)
+        m = re.search(r"Due[:\s]{0,10}([A-Za-z0-9,\-/]{1,40})", text, re.IGNORECASE)
         if m:
-            res["payment_due_date"] = parse_date(m.group(1))
+            due = parse_date(m.group(1))
+    return due
+
+
+def _extract_new_balance(text: str, issuer: Optional[str], stats=None) -> Optional[str]:
+    # New balance / Total balance
+    m = first_match(BALANCE_RULES, text, stats, issuer, "new_balance")
+    if not m:
+        m = first_match(ISSUER_RULES.get(issuer, {}).get("new_balance", []), text)
+    if m:
+        return f"${m.group(1)}"
+    # search for a currency amount near keywords 'Balance' or 'New Balance'
+    m = re.search(r"(New balance|Current balance|Total balance|Amount due|New account balance)[:\s\$]{0,15}([\d,]{1,20}\.\d{2})", text, re.IGNORECASE)
+    if m:
+        return f"${m.group(2)}"
+    return None
+
+
+FIELD_EXTRACTORS = {
+    "cardholder_name": _extract_cardholder_name,
+    "card_last4": _extract_card_last4,
+    "statement_period": _extract_statement_period,
+    "payment_due_date": _extract_payment_due_date,
+    "new_balance": _extract_new_balance,
+}
+
+
+def _code_digest(code) -> list:
+    # The loaded bytecode, not the file on disk, which may have been edited
+    # since import. Line numbers are left out so moving code around does not
+    # count as a rule change; a new Python version may change it.
+    consts = [_code_digest(c) if hasattr(c, "co_code")
+              else sorted(map(repr, c)) if isinstance(c, frozenset)  # set order varies per process
+              else repr(c) for c in code.co_consts]
+    return [code.co_code.hex(), consts, list(code.co_names)]
 
-    if not res["new_balance"]:
-        # search for a currency amount near keywords 'Balance' or 'New Balance'
-        m = re.search(r"(New balance|Current balance|Total balance|Amount due|New account balance)[:\s\$]*\s*([\d,]+\.\d{2})", text, re.IGNORECASE)
-        if m:
-            res["new_balance"] = f"${m.group(2)}"
+
+def _fingerprint(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        if callable(part):
+            part = _code_digest(part.__code__)
+        h.update(json.dumps(part).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+@lru_cache(maxsize=None)
+def _rule_fingerprints(issuer: Optional[str]) -> Tuple[Tuple[str, str], ...]:
+    fingerprints = [("issuer", _fingerprint(ISSUERS, detect_issuer))]
+    for field, extractor in FIELD_EXTRACTORS.items():
+        fingerprints.append((field, _fingerprint(
+            FIELD_RULES[field], ISSUER_RULES.get(issuer, {}).get(field, []),
+            extractor, first_match, parse_date,
+        )))
+    return tuple(fingerprints)
+
+
+def rule_fingerprints(issuer: Optional[str]) -> Dict[str, str]:
+    """Fingerprint of everything that decides each field's value for `issuer`.
+
+    A field's fingerprint covers its shared rule list, the issuer's own rules
+    for it and the extractor code, so editing one issuer's rules only changes
+    that issuer's fingerprints. Store these with a result to tell later which
+    of its fields are stale (see search_index.StatementIndex.reevaluate).
+
+    Fingerprints are computed once per issuer from the rules and code as
+    loaded (filled in at import), so they always describe the code that is
+    actually running. Code that changes rule lists at runtime must call
+    _rule_fingerprints.cache_clear() afterwards.
+    """
+    return dict(_rule_fingerprints(issuer))
+
+
+for _issuer in ISSUERS + [None]:
+    _rule_fingerprints(_issuer)
+
+
+def extract_fields_from_text(text: str, stats=None, fields=None) -> Dict[str, Optional[str]]:
+    # fields limits extraction to a subset of FIELDS (the issuer is always
+    # detected, since the other rules depend on it); the rest are left None.
+    res = dict.fromkeys(FIELDS)
+
+    issuer = detect_issuer(text)
+    res["issuer"] = issuer
+
+    for field, extractor in FIELD_EXTRACTORS.items():
+        if fields is None or field in fields:
+            res[field] = extractor(text, issuer, stats)
 
     return res
 
 
-def parse_pdf(path: str) -> Dict[str, Optional[str]]:
-    text = extract_text_from_pdf(path)
-    return extract_fields_from_text(text)
+def parse_pdf_timed(path: Union[str, BinaryIO], stats=None, workers: Optional[int] = None):
+    # (fields, text, (extract_seconds, fields_seconds, pages)) without recording
+    # metrics; worker processes return the timings for the parent to record,
+    # since metrics recorded in a worker are never exported.
+    start = time.perf_counter()
+    pages = extract_pages_from_pdf(path, workers)
+    text = "\n".join(pages)
+    extracted = time.perf_counter()
+    fields = extract_fields_from_text(text, stats)
+    return fields, text, (extracted - start, time.perf_counter() - extracted, len(pages))
+
+
+def parse_pdf_with_text(path: Union[str, BinaryIO], stats=None, workers: Optional[int] = None):
+    # (fields, extracted text); records per-stage timings and outcomes in metrics.REGISTRY
+    try:
+        fields, text, timings = parse_pdf_timed(path, stats, workers)
+    except Exception as e:
+        metrics.record_error(e)
+        raise
+    metrics.record_document(fields, *timings)
+    return fields, text
+
+
+def parse_pdf(path: Union[str, BinaryIO], stats=None, workers: Optional[int] = None) -> Dict[str, Optional[str]]:
+    return parse_pdf_with_text(path, stats, workers)[0]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+"""
+Compact Statement Records
+
+StatementRecord is a typed, __slots__-based alternative to the dicts returned
+by parse_pdf: balances are integer cents and dates are datetime.date objects.
+It also behaves as a read-only mapping with the original dict keys and string
+formats, so code written against parse_pdf / app.py rows keeps working.
+
+StatementColumns accumulates many records into typed arrays (one per field)
+and converts them to a pandas DataFrame or a pyarrow Table without building
+an intermediate list of dicts.
+"""
+
+import re
+from array import array
+from collections.abc import Mapping
+from datetime import date, datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from pdf_parser import FIELDS, parse_date
+
+
+# Keys exposed by the mapping view, matching the rows built in app.py.
+RECORD_KEYS = ("filename",) + FIELDS + ("status", "error")
+
+STATUSES = ("Success", "Error")
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def parse_cents(s: Optional[str]) -> Optional[int]:
+    """'$1,234.56' -> 123456, without going through float."""
+    if not s:
+        return None
+    m = re.search(r"(-?)([\d,]+)(?:\.(\d{1,2}))?", s)
+    if not m:
+        return None
+    dollars = int(m.group(2).replace(",", "") or 0)
+    cents = int((m.group(3) or "0").ljust(2, "0"))
+    value = dollars * 100 + cents
+    return -value if m.group(1) else value
+
+
+def format_cents(cents: Optional[int]) -> Optional[str]:
+    if cents is None:
+        return None
+    sign = "-" if cents < 0 else ""
+    return f"{sign}${abs(cents) // 100:,}.{abs(cents) % 100:02d}"
+
+
+def _to_date(s: Optional[str]) -> Optional[date]:
+    if not s:
+        return None
+    try:
+        return date.fromisoformat(s)
+    except ValueError:
+        iso = parse_date(s)
+        return date.fromisoformat(iso) if iso else None
+
+
+def parse_period(s: Optional[str]) -> Tuple[Optional[date], Optional[date]]:
+    """Start and end dates of a statement period such as '01/01/2024 - 01/31/2024'."""
+    if not s:
+        return None, None
+    parts = re.split(r"\s+(?:to|-|through)\s+", s.strip(), maxsplit=1, flags=re.IGNORECASE)
+    if len(parts) != 2:
+        return None, _to_date(s)
+    start = re.sub(r"^from\s+", "", parts[0], flags=re.IGNORECASE)
+    for fmt in ("%m/%d/%Y", "%m/%d/%y"):
+        try:
+            return (datetime.strptime(start, fmt).date(), datetime.strptime(parts[1], fmt).date())
+        except ValueError:
+            continue
+    return _to_date(start), _to_date(parts[1])
+
+
+class StatementRecord(Mapping):
+    """One parsed statement with typed fields and no per-instance __dict__."""
+
+    __slots__ = (
+        "filename", "issuer", "cardholder_name", "card_last4", "statement_period",
+        "period_start", "period_end", "payment_due_date", "new_balance_cents",
+        "status", "error",
+    )
+
+    def __init__(
+        self,
+        filename: Optional[str] = None,
+        issuer: Optional[str] = None,
+        cardholder_name: Optional[str] = None,
+        card_last4: Optional[str] = None,
+        statement_period: Optional[str] = None,
+        period_start: Optional[date] = None,
+        period_end: Optional[date] = None,
+        payment_due_date: Optional[date] = None,
+        new_balance_cents: Optional[int] = None,
+        status: str = "Success",
+        error: Optional[str] = None,
+    ):
+        self.filename = filename
+        self.issuer = issuer
+        self.cardholder_name = cardholder_name
+        self.card_last4 = card_last4
+        self.statement_period = statement_period
+        self.period_start = period_start
+        self.period_end = period_end
+        self.payment_due_date = payment_due_date
+        self.new_balance_cents = new_balance_cents
+        self.status = status
+        self.error = error
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "StatementRecord":
+        """Build from a parse_pdf result or an app.py / batch.py row."""
+        period_start, period_end = parse_period(d.get("statement_period"))
+        return cls(
+            filename=d.get("filename"),
+            issuer=d.get("issuer"),
+            cardholder_name=d.get("cardholder_name"),
+            card_last4=d.get("card_last4"),
+            statement_period=d.get("statement_period"),
+            period_start=period_start,
+            period_end=period_end,
+            payment_due_date=_to_date(d.get("payment_due_date")),
+            new_balance_cents=parse_cents(d.get("new_balance")),
+            status=d.get("status") or ("Error" if d.get("error") else "Success"),
+            error=d.get("error"),
+        )
+
+    def to_dict(self) -> dict:
+        return {key: self[key] for key in RECORD_KEYS}
+
+    # Mapping view with the legacy keys and string formats.
+    def __getitem__(self, key: str):
+        if key == "payment_due_date":
+            return self.payment_due_date.isoformat() if self.payment_due_date else None
+        if key == "new_balance":
+            return format_cents(self.new_balance_cents)
+        if key in RECORD_KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(RECORD_KEYS)
+
+    def __len__(self) -> int:
+        return len(RECORD_KEYS)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"StatementRecord({fields})"
+
+
+class StatementColumns:
+    """Array-backed columnar accumulator for batches of statement records.
+
+    Dates are stored as day ordinals and balances as cents in typed arrays;
+    issuer and status are dictionary-encoded. A separate null mask is kept
+    only for balances, since 0 is a valid balance but never a valid ordinal.
+    """
+
+    def __init__(self):
+        self.filename: List[Optional[str]] = []
+        self.cardholder_name: List[Optional[str]] = []
+        self.statement_period: List[Optional[str]] = []
+        self.error: List[Optional[str]] = []
+        self.issuer_codes = array("b")  # -1 = None, else index into self.issuers
+        self.issuers: List[str] = []
+        self.status_codes = array("b")  # index into STATUSES
+        self.card_last4 = array("h")  # -1 = None
+        self.period_start = array("i")  # date ordinal, 0 = None
+        self.period_end = array("i")
+        self.payment_due_date = array("i")
+        self.new_balance_cents = array("q")
+        self.new_balance_valid = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.status_codes)
+
+    def _issuer_code(self, issuer: Optional[str]) -> int:
+        if issuer is None:
+            return -1
+        try:
+            return self.issuers.index(issuer)
+        except ValueError:
+            self.issuers.append(issuer)
+            return len(self.issuers) - 1
+
+    def append(self, record) -> None:
+        """Append a StatementRecord or a parse_pdf-style dict."""
+        if not isinstance(record, StatementRecord):
+            record = StatementRecord.from_dict(record)
+        self.filename.append(record.filename)
+        self.cardholder_name.append(record.cardholder_name)
+        self.statement_period.append(record.statement_period)
+        self.error.append(record.error)
+        self.issuer_codes.append(self._issuer_code(record.issuer))
+        self.status_codes.append(STATUSES.index(record.status) if record.status in STATUSES else 1)
+        last4 = record.card_last4
+        self.card_last4.append(int(last4) if last4 and last4.isdigit() else -1)
+        for column, value in ((self.period_start, record.period_start),
+                              (self.period_end, record.period_end),
+                              (self.payment_due_date, record.payment_due_date)):
+            column.append(value.toordinal() if value else 0)
+        self.new_balance_cents.append(record.new_balance_cents or 0)
+        self.new_balance_valid.append(record.new_balance_cents is not None)
+
+    def extend(self, records: Iterable) -> None:
+        for record in records:
+            self.append(record)
+
+    def record(self, i: int) -> StatementRecord:
+        def day(column):
+            return date.fromordinal(column[i]) if column[i] else None
+
+        issuer_code = self.issuer_codes[i]
+        last4 = self.card_last4[i]
+        return StatementRecord(
+            filename=self.filename[i],
+            issuer=self.issuers[issuer_code] if issuer_code >= 0 else None,
+            cardholder_name=self.cardholder_name[i],
+            card_last4=f"{last4:04d}" if last4 >= 0 else None,
+            statement_period=self.statement_period[i],
+            period_start=day(self.period_start),
+            period_end=day(self.period_end),
+            payment_due_date=day(self.payment_due_date),
+            new_balance_cents=self.new_balance_cents[i] if self.new_balance_valid[i] else None,
+            status=STATUSES[self.status_codes[i]],
+            error=self.error[i],
+        )
+
+    def __iter__(self) -> Iterator[StatementRecord]:
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def _last4_strings(self):
+        """Zero-padded last-4 strings as a numpy object array, None where missing."""
+        import numpy as np
+        last4 = np.frombuffer(self.card_last4, dtype=np.int16)
+        if not len(last4):
+            return np.empty(0, dtype=object)
+        out = np.char.zfill(last4.astype(str), 4).astype(object)
+        out[last4 < 0] = None
+        return out
+
+    def _day_array(self, column):
+        import numpy as np
+        ordinals = np.frombuffer(column, dtype=np.int32)
+        days = (ordinals.astype("int64") - _EPOCH_ORDINAL).astype("datetime64[D]")
+        days[ordinals == 0] = np.datetime64("NaT")
+        return days
+
+    def to_dataframe(self):
+        """Build a pandas DataFrame straight from the column arrays."""
+        import numpy as np
+        import pandas as pd
+
+        cents = np.frombuffer(self.new_balance_cents, dtype=np.int64)
+        valid = np.frombuffer(bytes(self.new_balance_valid), dtype=np.bool_)
+        return pd.DataFrame({
+            "filename": self.filename,
+            "issuer": pd.Categorical.from_codes(np.frombuffer(self.issuer_codes, dtype=np.int8),
+                                                categories=self.issuers),
+            "cardholder_name": self.cardholder_name,
+            "card_last4": pd.Series(self._last4_strings(), dtype="string"),
+            "statement_period": self.statement_period,
+            "period_start": self._day_array(self.period_start),
+            "period_end": self._day_array(self.period_end),
+            "payment_due_date": self._day_array(self.payment_due_date),
+            "new_balance_cents": pd.arrays.IntegerArray(cents.copy(), ~valid),
+            "status": pd.Categorical.from_codes(np.frombuffer(self.status_codes, dtype=np.int8),
+                                                categories=list(STATUSES)),
+            "error": self.error,
+        })
+
+    def to_arrow(self):
+        """Build a pyarrow Table straight from the column arrays."""
+        import numpy as np
+        import pyarrow as pa
+
+        def days(column):
+            ordinals = np.frombuffer(column, dtype=np.int32)
+            return pa.array((ordinals - _EPOCH_ORDINAL).astype(np.int32), type=pa.date32(),
+                            mask=ordinals == 0)
+
+        issuer_codes = np.frombuffer(self.issuer_codes, dtype=np.int8)
+        return pa.table({
+            "filename": pa.array(self.filename, type=pa.string()),
+            "issuer": pa.DictionaryArray.from_arrays(
+                pa.array(issuer_codes, mask=issuer_codes < 0), pa.array(self.issuers, type=pa.string())),
+            "cardholder_name": pa.array(self.cardholder_name, type=pa.string()),
+            "card_last4": pa.array(self._last4_strings(), type=pa.string()),
+            "statement_period": pa.array(self.statement_period, type=pa.string()),
+            "period_start": days(self.period_start),
+            "period_end": days(self.period_end),
+            "payment_due_date": days(self.payment_due_date),
+            "new_balance_cents": pa.array(np.frombuffer(self.new_balance_cents, dtype=np.int64),
+                                          mask=~np.frombuffer(bytes(self.new_balance_valid), dtype=np.bool_)),
+            "status": pa.DictionaryArray.from_arrays(
+                pa.array(np.frombuffer(self.status_codes, dtype=np.int8)), pa.array(list(STATUSES))),
+            "error": pa.array(self.error, type=pa.string()),
+        })
@@ -0,0 +1,198 @@
+"""
+Rule Hit-Rate Telemetry
+
+Counts which regex in each field's rule list (see FIELD_RULES in pdf_parser.py)
+matched, per issuer, and persists the counters to a JSON file across runs.
+With adaptive ordering enabled the rules for an issuer/field are tried in
+order of observed hit count, ties broken by the original list position.
+
+Note that adaptive ordering changes rule priority: when several rules would
+match different values, the most frequently hitting rule now wins. For the
+same reason, counts recorded with --adaptive do not show which rule would
+have hit in the fixed order, so the report only estimates savings from
+counts recorded in the fixed order. The stats file records which mode was
+used.
+
+Usage:
+    python rule_stats.py record rule_stats.json statements/*.pdf [--adaptive]
+    python rule_stats.py report rule_stats.json
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, List, Optional
+
+from pdf_parser import FIELD_RULES, parse_pdf
+
+
+UNKNOWN_ISSUER = "unknown"
+
+
+class RuleStats:
+    """Per-issuer, per-field rule hit counters with optional adaptive ordering."""
+
+    def __init__(self, path: Optional[str] = None, adaptive: bool = False):
+        self.path = path
+        self.adaptive = adaptive
+        # {issuer: {field: {"hits": {pattern: count}, "misses": count}}}
+        self.counts: Dict[str, Dict[str, dict]] = {}
+        # Whether any counts were recorded in adaptive order; None for files
+        # written before the mode was stored.
+        self.recorded_adaptive: Optional[bool] = False
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.counts = data.get("issuers", {})
+            self.recorded_adaptive = data.get("recorded_adaptive") if self.counts else False
+
+    def _entry(self, issuer: Optional[str], field: str) -> dict:
+        per_issuer = self.counts.setdefault(issuer or UNKNOWN_ISSUER, {})
+        return per_issuer.setdefault(field, {"hits": {}, "misses": 0})
+
+    def record(self, issuer: Optional[str], field: str, rule: Optional[str]) -> None:
+        """Record the rule that matched, or a miss when rule is None."""
+        entry = self._entry(issuer, field)
+        if self.adaptive:
+            self.recorded_adaptive = True
+        if rule is None:
+            entry["misses"] += 1
+        else:
+            entry["hits"][rule] = entry["hits"].get(rule, 0) + 1
+
+    def ordered(self, issuer: Optional[str], field: str, rules: List[str]) -> List[str]:
+        """Return rules in evaluation order (unchanged unless adaptive)."""
+        if not self.adaptive:
+            return rules
+        entry = self.counts.get(issuer or UNKNOWN_ISSUER, {}).get(field)
+        if not entry or not entry["hits"]:
+            return rules
+        return adaptive_order(rules, entry["hits"])
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write counters to disk atomically."""
+        path = path or self.path
+        if not path:
+            raise ValueError("No path given for rule stats")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 2, "recorded_adaptive": self.recorded_adaptive, "issuers": self.counts},
+                      f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def report(self) -> List[dict]:
+        """Regex evaluations in the fixed order vs. the adaptive order.
+
+        A hit on the rule at position i costs i + 1 evaluations; a miss costs
+        one evaluation per rule. This assumes the rule that hit is the first
+        one that matches in the fixed order, which only holds for counts
+        recorded without adaptive ordering; otherwise the evaluation columns
+        are None. Hits on patterns no longer in FIELD_RULES (rules edited
+        since recording) are reported as stale_hits and left out of the
+        evaluation counts.
+        """
+        fixed_order = self.recorded_adaptive is not True
+        rows = []
+        for issuer in sorted(self.counts):
+            for field in sorted(self.counts[issuer]):
+                rules = FIELD_RULES.get(field, [])
+                entry = self.counts[issuer][field]
+                hits = {rx: n for rx, n in entry["hits"].items() if rx in rules}
+                stale_hits = sum(n for rx, n in entry["hits"].items() if rx not in rules)
+                misses = entry["misses"]
+                row = {
+                    "issuer": issuer,
+                    "field": field,
+                    "documents": sum(hits.values()) + stale_hits + misses,
+                    "misses": misses,
+                    "stale_hits": stale_hits,
+                    "baseline_evals": None,
+                    "adaptive_evals": None,
+                    "saved_evals": None,
+                }
+                if fixed_order and rules:
+                    adaptive = adaptive_order(rules, hits)
+                    baseline_evals = adaptive_evals = misses * len(rules)
+                    for rx, n in hits.items():
+                        baseline_evals += n * (rules.index(rx) + 1)
+                        adaptive_evals += n * (adaptive.index(rx) + 1)
+                    row.update(baseline_evals=baseline_evals, adaptive_evals=adaptive_evals,
+                               saved_evals=baseline_evals - adaptive_evals)
+                rows.append(row)
+        return rows
+
+
+def adaptive_order(rules: List[str], hits: Dict[str, int]) -> List[str]:
+    """Sort rules by descending hit count; ties keep the original order."""
+    position = {rx: i for i, rx in enumerate(rules)}
+    return sorted(rules, key=lambda rx: (-hits.get(rx, 0), position[rx]))
+
+
+def print_report(stats: RuleStats) -> None:
+    rows = stats.report()
+    if not rows:
+        print("No rule statistics recorded yet.")
+        return
+
+    def cell(value):
+        return f"{value:9d}" if value is not None else f"{'-':>9s}"
+
+    print(f"{'Issuer':18s} {'Field':18s} {'Docs':>7s} {'Misses':>7s} {'Stale':>7s} "
+          f"{'Fixed':>9s} {'Adaptive':>9s} {'Saved':>9s}")
+    total_baseline = total_adaptive = total_stale = 0
+    for row in rows:
+        total_stale += row["stale_hits"]
+        if row["baseline_evals"] is not None:
+            total_baseline += row["baseline_evals"]
+            total_adaptive += row["adaptive_evals"]
+        print(f"{row['issuer']:18s} {row['field']:18s} {row['documents']:7d} {row['misses']:7d} "
+              f"{row['stale_hits']:7d} {cell(row['baseline_evals'])} {cell(row['adaptive_evals'])} "
+              f"{cell(row['saved_evals'])}")
+
+    print()
+    if total_stale:
+        print(f"Stale: {total_stale} hit(s) were recorded for patterns no longer in FIELD_RULES "
+              f"and are excluded; re-record to measure the current rules.")
+    if stats.recorded_adaptive:
+        print("Counts were recorded with --adaptive, so the rule that would have hit in the fixed "
+              "order is unknown and savings cannot be estimated. Record without --adaptive to measure them.")
+        return
+    if stats.recorded_adaptive is None:
+        print("Recording mode unknown (stats file from an older version); the estimate below "
+              "assumes counts were recorded without --adaptive.")
+    saved = total_baseline - total_adaptive
+    pct = 100.0 * saved / total_baseline if total_baseline else 0.0
+    print(f"Regex evaluations: fixed order {total_baseline}, adaptive {total_adaptive}, "
+          f"saved {saved} ({pct:.1f}%)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Record and report per-issuer rule hit rates")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="Parse PDFs and add their rule hits to the stats file")
+    rec.add_argument("stats_file")
+    rec.add_argument("pdfs", nargs="+")
+    rec.add_argument("--adaptive", action="store_true",
+                     help="Evaluate rules in observed hit-rate order while recording")
+
+    rep = sub.add_parser("report", help="Show evaluations saved by adaptive ordering")
+    rep.add_argument("stats_file")
+
+    args = ap.parse_args()
+
+    if args.command == "record":
+        stats = RuleStats(args.stats_file, adaptive=args.adaptive)
+        for path in args.pdfs:
+            try:
+                parse_pdf(path, stats=stats)
+            except Exception as e:
+                print(f"[FAIL] {path}: {e}")
+        stats.save()
+        print(f"Recorded {len(args.pdfs)} file(s) to {args.stats_file}")
+    else:
+        print_report(RuleStats(args.stats_file))
+
+
+if __name__ == "__main__":
+    main()
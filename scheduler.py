@@ -0,0 +1,303 @@
+"""
+Priority Parse Scheduler
+
+A scheduling layer in front of the parser's process pool, so interactive
+uploads do not queue behind a bulk re-parse. Jobs are submitted with a
+priority class; each class has its own FIFO queue and a weight, and free
+workers are handed out by stride scheduling: with both classes backlogged,
+a class receives a share of dispatches proportional to its weight (8:1 by
+default), so bulk work keeps moving but interactive jobs go first.
+
+Only as many documents as there are workers are handed to the pool at once;
+everything else waits in the class queues. A newly submitted interactive
+job therefore waits for at most one document to finish on some worker,
+never for the bulk backlog (preemption at document granularity).
+
+If a worker process dies (a crash, or the OOM killer on a huge statement),
+the pool is replaced and the jobs that were in flight on it run once more;
+only a job that takes down a worker a second time fails.
+
+Scheduling is per process: a bulk re-parse only yields to interactive work
+if it is submitted to the same ParseScheduler. The bulk entry points
+(batch.parse_batch, search_index.ingest, text_store.cache) take a
+`scheduler` argument for that and then queue all their documents as "bulk"
+instead of starting a pool of their own; the app uses it to index a folder
+in the background while uploads go first.
+
+    scheduler = ParseScheduler(workers=4)
+    future = scheduler.submit("upload.pdf", priority="interactive")
+    futures = scheduler.map(archive_paths, priority="bulk")
+    records = batch.parse_batch(archive_paths, scheduler=scheduler)
+    scheduler.stats()   # per class: queued, running, completed, wait p50/p95
+
+Usage (demo under synthetic load):
+    python scheduler.py --bulk 200 --interactive 20 --interval 0.5 [--no-priority]
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import metrics
+from pdf_parser import parse_pdf_timed
+
+
+Source = Union[str, bytes]
+
+# Priority classes in tie-break order, with their default dispatch weights.
+DEFAULT_WEIGHTS = {"interactive": 8, "bulk": 1}
+
+# Wait times kept per class for the percentile stats.
+WAIT_WINDOW = 10000
+
+
+def _parse_job(source: Source, include_text: bool):
+    fp = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    fields, text, timings = parse_pdf_timed(fp)
+    if include_text:
+        fields["text"] = text
+    return fields, timings
+
+
+class _Job:
+    __slots__ = ("fn", "args", "parse", "priority", "future", "submitted", "attempts")
+
+    def __init__(self, fn: Callable, args: tuple, priority: str, parse: bool = False):
+        # parse: fn is _parse_job, whose (fields, timings) result is recorded in metrics
+        self.fn = fn
+        self.args = args
+        self.parse = parse
+        self.priority = priority
+        self.future = Future()
+        self.submitted = time.perf_counter()
+        self.attempts = 0
+
+
+class ParseScheduler:
+    """Weighted fair dispatch of parse jobs from priority classes to a process pool."""
+
+    def __init__(self, workers: Optional[int] = None, weights: Optional[Dict[str, float]] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        if not self.weights or any(w <= 0 for w in self.weights.values()):
+            raise ValueError("Priority weights must be positive")
+        self.executor = self._new_executor()
+
+        self._cond = threading.Condition()
+        self._queues = {name: deque() for name in self.weights}
+        # Stride scheduling: the class with the lowest pass value goes next and
+        # advances its pass by 1 / weight. A class that was idle rejoins at the
+        # current virtual time, so it cannot bank credit while idle.
+        self._pass = dict.fromkeys(self.weights, 0.0)
+        self._virtual_time = 0.0
+        self._running = dict.fromkeys(self.weights, 0)
+        self._completed = dict.fromkeys(self.weights, 0)
+        self._waits = {name: deque(maxlen=WAIT_WINDOW) for name in self.weights}
+        self._closed = False
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="parse-scheduler", daemon=True)
+        self._dispatcher.start()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Workers are spawned, not forked: the app creates the pool from inside
+        # a threaded server, and a forked child inherits its locks mid-use.
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Swap in a new pool if `broken` is still the current one; returns the current pool."""
+        with self._cond:
+            if self.executor is broken:
+                self.executor = self._new_executor()
+                broken.shutdown(wait=False)
+            return self.executor
+
+    def submit(self, source: Source, priority: str = "bulk", include_text: bool = False) -> Future:
+        """Queue one PDF (path or bytes); the future resolves to the parsed fields.
+
+        With include_text, the fields dict also carries the extracted text under "text".
+        """
+        return self._enqueue(_Job(_parse_job, (source, include_text), priority, parse=True))
+
+    def call(self, fn: Callable, *args, priority: str = "bulk") -> Future:
+        """Queue fn(*args) to run on a worker like a parse job; the future resolves to its result.
+
+        For bulk paths with their own worker function (batch, text_store). fn
+        must be picklable, i.e. defined at module level, and records no metrics.
+        """
+        return self._enqueue(_Job(fn, args, priority))
+
+    def _enqueue(self, job: _Job) -> Future:
+        priority = job.priority
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority!r} (expected one of {tuple(self._queues)})")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is shut down")
+            queue = self._queues[priority]
+            if not queue and not self._running[priority]:
+                self._pass[priority] = max(self._pass[priority], self._virtual_time)
+            queue.append(job)
+            metrics.QUEUE_DEPTH.set(len(queue), priority=priority)
+            self._cond.notify()
+        return job.future
+
+    def map(self, sources: Sequence[Source], priority: str = "bulk", include_text: bool = False) -> List[Future]:
+        return [self.submit(source, priority, include_text) for source in sources]
+
+    def _next_job(self) -> Optional[_Job]:
+        ready = [name for name, queue in self._queues.items() if queue]
+        if not ready:
+            return None
+        name = min(ready, key=lambda n: self._pass[n])
+        self._virtual_time = self._pass[name]
+        self._pass[name] += 1.0 / self.weights[name]
+        job = self._queues[name].popleft()
+        metrics.QUEUE_DEPTH.set(len(self._queues[name]), priority=name)
+        return job
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    busy = sum(self._running.values())
+                    if busy < self.workers and any(self._queues.values()):
+                        break
+                    if self._closed and not any(self._queues.values()) and not busy:
+                        return
+                    self._cond.wait()
+                job = self._next_job()
+                retry = job.attempts > 0
+                if not retry and not job.future.set_running_or_notify_cancel():
+                    continue
+                job.attempts += 1
+                self._running[job.priority] += 1
+                wait = time.perf_counter() - job.submitted
+                if not retry:
+                    self._waits[job.priority].append(wait)
+            if not retry:
+                metrics.QUEUE_WAIT_SECONDS.observe(wait, priority=job.priority)
+            executor = self.executor
+            try:
+                try:
+                    inner = executor.submit(job.fn, *job.args)
+                except BrokenProcessPool:
+                    executor = self._replace_executor(executor)
+                    inner = executor.submit(job.fn, *job.args)
+            except Exception as e:
+                self._finish(job, None, e)
+            else:
+                inner.add_done_callback(lambda f, job=job, executor=executor: self._finish(job, f, None, executor))
+
+    def _finish(self, job: _Job, inner: Optional[Future], error: Optional[BaseException],
+                executor: Optional[ProcessPoolExecutor] = None) -> None:
+        if error is None:
+            error = inner.exception()
+        if isinstance(error, BrokenProcessPool) and executor is not None:
+            self._replace_executor(executor)
+            # Every job in flight on the pool fails with it, not just the one
+            # whose worker died; run each once more on the new pool.
+            if job.attempts < 2:
+                with self._cond:
+                    self._running[job.priority] -= 1
+                    self._queues[job.priority].appendleft(job)
+                    metrics.QUEUE_DEPTH.set(len(self._queues[job.priority]), priority=job.priority)
+                    self._cond.notify()
+                return
+        if error is None and job.parse:
+            fields, timings = inner.result()
+            metrics.record_document({k: v for k, v in fields.items() if k != "text"}, *timings)
+            job.future.set_result(fields)
+        elif error is None:
+            job.future.set_result(inner.result())
+        else:
+            if job.parse:
+                metrics.record_error(error)
+            job.future.set_exception(error)
+        with self._cond:
+            self._running[job.priority] -= 1
+            self._completed[job.priority] += 1
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, dict]:
+        """Per class: queued, running, completed, and wait-time p50/p95 in seconds."""
+        with self._cond:
+            snapshot = {name: (len(self._queues[name]), self._running[name], self._completed[name],
+                               sorted(self._waits[name])) for name in self._queues}
+        return {
+            name: {"queued": queued, "running": running, "completed": completed,
+                   "wait_p50": metrics.percentile(waits, 50) if waits else None,
+                   "wait_p95": metrics.percentile(waits, 95) if waits else None}
+            for name, (queued, running, completed, waits) in snapshot.items()
+        }
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """Stop accepting jobs; finish queued ones (or cancel them) and close the pool."""
+        with self._cond:
+            self._closed = True
+            if cancel_pending:
+                for name, queue in self._queues.items():
+                    while queue:
+                        queue.popleft().future.cancel()
+                    metrics.QUEUE_DEPTH.set(0, priority=name)
+            self._cond.notify_all()
+        if wait:
+            self._dispatcher.join()
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Interactive latency under bulk load, with and without priorities")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--bulk", type=int, default=200, help="Bulk documents queued up front")
+    ap.add_argument("--interactive", type=int, default=20, help="Interactive documents, one per interval")
+    ap.add_argument("--interval", type=float, default=0.5, help="Seconds between interactive submissions")
+    ap.add_argument("--no-priority", action="store_true", help="Submit interactive jobs as bulk (FIFO baseline)")
+    args = ap.parse_args()
+
+    from loadgen import build_corpus
+    corpus = build_corpus(num_each=2)
+
+    with ParseScheduler(args.workers) as scheduler:
+        # Warm the pool so process start-up is not billed to the first jobs.
+        for future in scheduler.map(corpus[:scheduler.workers], priority="interactive"):
+            future.result()
+        bulk = scheduler.map([corpus[i % len(corpus)] for i in range(args.bulk)], priority="bulk")
+        priority = "bulk" if args.no_priority else "interactive"
+        latencies = []
+        for i in range(args.interactive):
+            start = time.perf_counter()
+            scheduler.submit(corpus[i % len(corpus)], priority=priority).result()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(max(0.0, args.interval - (time.perf_counter() - start)))
+        stats = scheduler.stats()
+        for future in bulk:
+            future.cancel()
+
+    latencies.sort()
+    mode = "FIFO (no priority)" if args.no_priority else "weighted priority"
+    print(f"{mode}: {args.interactive} interactive jobs behind {args.bulk} bulk, "
+          f"{scheduler.workers} worker(s)")
+    print(f"  interactive latency p50 {1000 * metrics.percentile(latencies, 50):.0f} ms, "
+          f"p95 {1000 * metrics.percentile(latencies, 95):.0f} ms")
+    for name, s in stats.items():
+        p50 = f"{1000 * s['wait_p50']:.0f}" if s["wait_p50"] is not None else "-"
+        p95 = f"{1000 * s['wait_p95']:.0f}" if s["wait_p95"] is not None else "-"
+        print(f"  {name:12s} queued {s['queued']:5d}  completed {s['completed']:5d}  "
+              f"wait p50 {p50} ms  p95 {p95} ms")
+
+
+if __name__ == "__main__":
+    main()
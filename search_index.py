@@ -0,0 +1,338 @@
+"""
+Statement Search Index
+
+Optional local SQLite index of parsed statements. Each document is stored
+once (keyed by the SHA-256 of its PDF bytes) with its parsed fields in a plain
+table and its extracted text in an FTS5 full-text table, so questions like
+"which statements mention merchant X" or "card ending 1234 across two years"
+are answered without re-extracting any PDF.
+
+The index holds full statement text: keep the database file local and out of
+version control, like the statements themselves.
+
+Usage:
+    python search_index.py ingest statements.db statements/*.pdf [--workers N]
+    python search_index.py search statements.db "whole foods" --last4 1234 --from 2023-01-01
+    python search_index.py reevaluate statements.db [--dry-run]
+
+Every document is stored with the rule fingerprints (pdf_parser.rule_fingerprints)
+that produced its fields; `reevaluate` re-extracts only the fields whose rules
+have changed since, and only for the issuers those rules apply to.
+"""
+
+import argparse
+import json
+import sqlite3
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pdf_parser import FIELDS, document_hash, extract_fields_from_text, rule_fingerprints
+from records import format_cents, parse_cents, parse_period
+
+
+DEFAULT_INDEX_PATH = "statements.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statements (
+    id INTEGER PRIMARY KEY,
+    doc_hash TEXT NOT NULL UNIQUE,
+    filename TEXT,
+    issuer TEXT,
+    cardholder_name TEXT,
+    card_last4 TEXT,
+    statement_period TEXT,
+    period_start TEXT,
+    period_end TEXT,
+    payment_due_date TEXT,
+    new_balance_cents INTEGER,
+    rule_versions TEXT,
+    indexed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS statements_last4 ON statements (card_last4, payment_due_date);
+CREATE INDEX IF NOT EXISTS statements_issuer ON statements (issuer, payment_due_date);
+CREATE INDEX IF NOT EXISTS statements_due ON statements (payment_due_date);
+CREATE VIRTUAL TABLE IF NOT EXISTS statement_text USING fts5 (text, tokenize = 'unicode61');
+"""
+
+
+def fts_query(text: str) -> str:
+    """Quote each word so user input is matched literally, not as FTS5 syntax."""
+    tokens = [t for t in text.split() if any(c.isalnum() for c in t)]
+    return " ".join('"' + token.replace('"', '""') + '"' for token in tokens)
+
+
+def _field_values(fields: dict) -> tuple:
+    """Column values from issuer through new_balance_cents for a parsed result."""
+    period_start, period_end = parse_period(fields.get("statement_period"))
+    return (
+        fields.get("issuer"), fields.get("cardholder_name"), fields.get("card_last4"),
+        fields.get("statement_period"),
+        period_start.isoformat() if period_start else None,
+        period_end.isoformat() if period_end else None,
+        fields.get("payment_due_date"), parse_cents(fields.get("new_balance")),
+    )
+
+
+class StatementIndex:
+    """SQLite FTS5 index of statement text and parsed fields."""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(statements)")}
+        if "rule_versions" not in columns:
+            # Indexes created before rule fingerprints existed: every row is stale.
+            self.conn.execute("ALTER TABLE statements ADD COLUMN rule_versions TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM statements").fetchone()[0]
+
+    def contains(self, doc_hash: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM statements WHERE doc_hash = ?", (doc_hash,)).fetchone()
+        return row is not None
+
+    def add(self, doc_hash: str, text: str, fields: dict, filename: Optional[str] = None,
+            commit: bool = True, rule_versions: Optional[Dict[str, str]] = None) -> Optional[int]:
+        """Insert one document; returns its id, or None if it was already indexed.
+
+        Pass commit=False when adding many documents and call commit() once at
+        the end: one transaction per document is the main cost of bulk ingest.
+        rule_versions defaults to the current rule fingerprints for the
+        document's issuer, i.e. it assumes `fields` came from the current rules.
+        """
+        if rule_versions is None:
+            rule_versions = rule_fingerprints(fields.get("issuer"))
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO statements (doc_hash, filename, issuer, cardholder_name, card_last4, "
+            "statement_period, period_start, period_end, payment_due_date, new_balance_cents, "
+            "rule_versions, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (doc_hash, filename) + _field_values(fields)
+            + (json.dumps(rule_versions), datetime.now().isoformat(timespec="seconds")),
+        )
+        if cur.rowcount == 0:
+            return None
+        doc_id = cur.lastrowid
+        self.conn.execute("INSERT INTO statement_text (rowid, text) VALUES (?, ?)", (doc_id, text))
+        if commit:
+            self.conn.commit()
+        return doc_id
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def reevaluate(self, dry_run: bool = False, batch_size: int = 1000) -> Dict[tuple, int]:
+        """Re-extract only the fields whose rules changed since each document was indexed.
+
+        Compares the rule fingerprints stored with every document against the
+        current ones for its issuer and re-runs just the stale fields over the
+        stored text. If issuer detection itself changed, the issuer is
+        re-detected first and the other fields are compared against the new
+        issuer's rules. Returns {(issuer, field): documents updated}; with
+        dry_run, what would be updated, without touching the index.
+        """
+        fingerprints = rule_fingerprints
+        updated = Counter()
+        stale = []
+        for row in self.conn.execute("SELECT id, issuer, rule_versions FROM statements"):
+            stored = json.loads(row["rule_versions"] or "{}")
+            changed = [f for f in FIELDS if stored.get(f) != fingerprints(row["issuer"])[f]]
+            if changed:
+                stale.append((row["id"], row["issuer"], stored, changed))
+
+        for n, (doc_id, issuer, stored, changed) in enumerate(stale, 1):
+            text = self.conn.execute("SELECT text FROM statement_text WHERE rowid = ?",
+                                     (doc_id,)).fetchone()[0]
+            if "issuer" in changed:
+                issuer = extract_fields_from_text(text, fields=())["issuer"]
+                changed = ["issuer"] + [f for f in FIELDS[1:] if stored.get(f) != fingerprints(issuer)[f]]
+            for field in changed:
+                updated[(issuer, field)] += 1
+            if dry_run:
+                continue
+
+            row = dict(self.conn.execute("SELECT * FROM statements WHERE id = ?", (doc_id,)).fetchone())
+            row["new_balance"] = format_cents(row["new_balance_cents"])
+            row.update({f: v for f, v in extract_fields_from_text(text, fields=changed).items() if f in changed})
+            self.conn.execute(
+                "UPDATE statements SET issuer = ?, cardholder_name = ?, card_last4 = ?, statement_period = ?, "
+                "period_start = ?, period_end = ?, payment_due_date = ?, new_balance_cents = ?, "
+                "rule_versions = ? WHERE id = ?",
+                _field_values(row) + (json.dumps(fingerprints(issuer)), doc_id),
+            )
+            if n % batch_size == 0:
+                self.conn.commit()
+        self.conn.commit()
+        return dict(updated)
+
+    def optimize(self) -> None:
+        """Merge FTS5 index segments; worth running after a large ingest."""
+        self.conn.execute("INSERT INTO statement_text (statement_text) VALUES ('optimize')")
+        self.conn.commit()
+
+    def search(
+        self,
+        text: Optional[str] = None,
+        issuer: Optional[str] = None,
+        card_last4: Optional[str] = None,
+        cardholder: Optional[str] = None,
+        due_from: Optional[str] = None,
+        due_to: Optional[str] = None,
+        limit: int = 50,
+        raw: bool = False,
+    ) -> List[dict]:
+        """Find statements by free text and/or fields.
+
+        Free-text words must all appear in the document (pass raw=True to use
+        FTS5 query syntax as-is); text without any words is ignored. Dates
+        are ISO strings compared against the payment due date. Text matches
+        are ranked by relevance, everything else by most recent due date.
+        """
+        where, params = [], []
+        # Input with no searchable words (e.g. "-") quotes to an empty query,
+        # which FTS5 rejects; search on the other filters alone instead.
+        query = (text if raw else fts_query(text)) if text else ""
+        if query:
+            select = ("SELECT s.*, snippet(statement_text, 0, '[', ']', '...', 12) AS snippet "
+                      "FROM statement_text JOIN statements s ON s.id = statement_text.rowid")
+            where.append("statement_text MATCH ?")
+            params.append(query)
+            order = "bm25(statement_text)"
+        else:
+            select = "SELECT s.*, NULL AS snippet FROM statements s"
+            order = "s.payment_due_date DESC"
+        if issuer:
+            where.append("s.issuer = ?")
+            params.append(issuer.lower())
+        if card_last4:
+            where.append("s.card_last4 = ?")
+            params.append(card_last4)
+        if cardholder:
+            where.append("s.cardholder_name LIKE ?")
+            params.append(f"%{cardholder}%")
+        if due_from:
+            where.append("s.payment_due_date >= ?")
+            params.append(due_from)
+        if due_to:
+            where.append("s.payment_due_date <= ?")
+            params.append(due_to)
+
+        sql = select
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        results = []
+        for row in self.conn.execute(sql, params):
+            record = {"filename": row["filename"]}
+            for field in FIELDS:
+                record[field] = row[field] if field != "new_balance" else format_cents(row["new_balance_cents"])
+            record["snippet"] = row["snippet"]
+            record["doc_hash"] = row["doc_hash"]
+            results.append(record)
+        return results
+
+
+def ingest(index: StatementIndex, paths: Iterable[str], workers: Optional[int] = None,
+           chunk_size: int = 500, scheduler=None) -> dict:
+    """Parse and index PDFs that are not in the index yet, in parallel chunks.
+
+    With a scheduler.ParseScheduler, parsing runs on its workers as "bulk"
+    work (see batch.parse_batch).
+    """
+    from batch import parse_batch
+
+    counts = {"added": 0, "skipped": 0, "errors": 0}
+    todo = []
+    for path in paths:
+        with open(path, "rb") as f:
+            doc_hash = document_hash(f.read())
+        if index.contains(doc_hash):
+            counts["skipped"] += 1
+        else:
+            todo.append((path, doc_hash))
+
+    for start in range(0, len(todo), chunk_size):
+        chunk = todo[start:start + chunk_size]
+        records = parse_batch([p for p, _ in chunk], workers=workers, include_text=True, scheduler=scheduler)
+        for (path, doc_hash), record in zip(chunk, records):
+            if record["status"] == "Error":
+                counts["errors"] += 1
+                print(f"[ERROR] {path}: {record['error']}")
+                continue
+            if index.add(doc_hash, record["text"], record, filename=record["filename"], commit=False):
+                counts["added"] += 1
+            else:
+                counts["skipped"] += 1
+        index.commit()
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Full-text search index over parsed statements")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ing = sub.add_parser("ingest", help="Parse PDFs and add new ones to the index")
+    ing.add_argument("index")
+    ing.add_argument("pdfs", nargs="+")
+    ing.add_argument("--workers", type=int, default=None)
+    ing.add_argument("--optimize", action="store_true", help="Merge FTS segments afterwards")
+
+    reev = sub.add_parser("reevaluate", help="Re-extract fields whose rules changed since indexing")
+    reev.add_argument("index")
+    reev.add_argument("--dry-run", action="store_true", help="Only report what would be updated")
+
+    srch = sub.add_parser("search", help="Query the index")
+    srch.add_argument("index")
+    srch.add_argument("text", nargs="?", default=None, help="Free text, e.g. a merchant name")
+    srch.add_argument("--issuer")
+    srch.add_argument("--last4")
+    srch.add_argument("--cardholder")
+    srch.add_argument("--from", dest="due_from", help="Earliest payment due date (YYYY-MM-DD)")
+    srch.add_argument("--to", dest="due_to", help="Latest payment due date (YYYY-MM-DD)")
+    srch.add_argument("--limit", type=int, default=50)
+    srch.add_argument("--raw", action="store_true", help="Pass the text as an FTS5 query")
+
+    args = ap.parse_args()
+
+    with StatementIndex(args.index) as index:
+        if args.command == "ingest":
+            counts = ingest(index, args.pdfs, workers=args.workers)
+            if args.optimize:
+                index.optimize()
+            print(f"Added {counts['added']}, skipped {counts['skipped']} already indexed, "
+                  f"{counts['errors']} errors; {len(index)} statements in {args.index}")
+        elif args.command == "reevaluate":
+            updated = index.reevaluate(dry_run=args.dry_run)
+            for (issuer, field), count in sorted(updated.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+                print(f"{issuer or 'unknown':18s} {field:18s} {count:8d}")
+            verb = "Would update" if args.dry_run else "Updated"
+            print(f"{verb} {sum(updated.values())} field values across {len(index)} indexed statements")
+        else:
+            results = index.search(args.text, issuer=args.issuer, card_last4=args.last4,
+                                   cardholder=args.cardholder, due_from=args.due_from,
+                                   due_to=args.due_to, limit=args.limit, raw=args.raw)
+            for r in results:
+                print(f"{r['filename']}: {r['issuer']}, {r['cardholder_name']}, ending {r['card_last4']}, "
+                      f"due {r['payment_due_date']}, {r['new_balance']}")
+                if r["snippet"]:
+                    print(f"    {r['snippet']}")
+            print(f"{len(results)} result(s)")
+
+
+if __name__ == "__main__":
+    main()
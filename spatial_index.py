@@ -0,0 +1,352 @@
+"""
+Spatial Word Index
+
+Layout-aware key/value lookup for statement fields, used as a fallback for
+layouts the regex rules in pdf_parser.py cannot read: when a label and its
+value sit in separate columns, the flattened text no longer puts them next to
+each other. Each page's words (with their bounding boxes from pdfplumber) are
+indexed in a uniform grid and by normalized text, so a query such as "the
+value to the right of 'Payment due date'" only touches the words next to the
+label.
+
+On a one-page statement this is slower than the regex path: indexing the
+words alone costs about as much as running every field regex (see
+benchmark_layout.py). parse_pdf_layout therefore runs the regex rules first
+and indexes the pages only for the fields they miss.
+
+Usage: python spatial_index.py <file.pdf>
+"""
+
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pdfplumber
+
+from pdf_parser import FIELDS, detect_issuer, parse_date, parse_pdf, release_page
+
+
+Box = Tuple[float, float, float, float]  # x0, top, x1, bottom
+
+# Labels tried per field, most specific first. "right" looks for the value on
+# the same line after the label, "below" on the next line under the label.
+LAYOUT_LABELS = {
+    "card_last4": [
+        ("Account number ending in", "right"),
+        ("Account ending in", "right"),
+        ("Card ending in", "right"),
+        ("ending in", "right"),
+    ],
+    "cardholder_name": [
+        ("Account holder", "right"),
+        ("Account summary for", "right"),
+        ("Statement for", "right"),
+        ("Cardholder", "right"),
+        ("Member Name", "right"),
+    ],
+    "statement_period": [
+        ("Statement period", "right"),
+        ("Billing period", "right"),
+        ("Billing cycle", "right"),
+        ("Statement period", "below"),
+        ("Billing period", "below"),
+        ("Billing cycle", "below"),
+        ("Statement closing date", "right"),
+        ("Statement closing date", "below"),
+    ],
+    "payment_due_date": [
+        ("Payment due date", "right"),
+        ("Due date", "right"),
+        ("Payment due", "right"),
+        ("Pay by", "right"),
+        ("Payment due date", "below"),
+    ],
+    "new_balance": [
+        ("New balance", "right"),
+        ("New account balance", "right"),
+        ("Current balance", "right"),
+        ("Total balance", "right"),
+        ("Amount due", "right"),
+        ("Total due", "right"),
+        ("New balance", "below"),
+    ],
+}
+
+
+def _norm(token: str) -> str:
+    return token.strip().rstrip(":").lower()
+
+
+@lru_cache(maxsize=None)
+def _label_tokens(label: str) -> Tuple[str, ...]:
+    return tuple(_norm(t) for t in label.split())
+
+
+def _vertical_overlap(a: Box, b: Box) -> bool:
+    overlap = min(a[3], b[3]) - max(a[1], b[1])
+    return overlap > 0.5 * min(a[3] - a[1], b[3] - b[1])
+
+
+class PageIndex:
+    """Uniform grid over the word bounding boxes of one page.
+
+    Each word can also be followed to its nearest neighbour to the right on the
+    same line, so multi-word labels and same-line values are read without
+    further grid queries. Lines are found once per page by grouping words on
+    their vertical centre and sorting each line by x0.
+
+    Everything beyond the word list is built lazily: a label whose words do
+    not all occur in the page text is rejected with a substring test, so pages
+    without labels (transaction pages, say) never build the token map, the
+    grid or the lines.
+    """
+
+    def __init__(self, words: List[dict], cell_size: float = 64.0, max_distance: float = 250.0):
+        self.words = words
+        self.cell_size = cell_size
+        self.max_distance = max_distance
+        self._boxes: Optional[List[Box]] = None
+        self._by_text: Optional[Dict[str, List[int]]] = None
+        self._cells: Optional[Dict[Tuple[int, int], List[int]]] = None
+        self._lines: Optional[List[List[int]]] = None
+        self._line_of: Optional[List[Tuple[int, int]]] = None
+        self._next_word: Dict[int, Optional[int]] = {}
+        self._text: Optional[str] = None
+        self._lower: Optional[str] = None
+
+    @property
+    def boxes(self) -> List[Box]:
+        if self._boxes is None:
+            self._boxes = [(w["x0"], w["top"], w["x1"], w["bottom"]) for w in self.words]
+        return self._boxes
+
+    @property
+    def by_text(self) -> Dict[str, List[int]]:
+        if self._by_text is None:
+            by_text = defaultdict(list)
+            for i, w in enumerate(self.words):
+                by_text[w["text"].strip().rstrip(":").lower()].append(i)  # _norm, inlined
+            self._by_text = by_text
+        return self._by_text
+
+    @property
+    def cells(self) -> Dict[Tuple[int, int], List[int]]:
+        if self._cells is None:
+            cs = self.cell_size
+            cells = defaultdict(list)
+            for i, (x0, top, x1, bottom) in enumerate(self.boxes):
+                for cx in range(int(x0 // cs), int(x1 // cs) + 1):
+                    for cy in range(int(top // cs), int(bottom // cs) + 1):
+                        cells[cx, cy].append(i)
+            self._cells = cells
+        return self._cells
+
+    @classmethod
+    def from_page(cls, page, cell_size: float = 64.0) -> "PageIndex":
+        return cls(page.extract_words(), cell_size)
+
+    def _cells_for(self, box: Box) -> Iterator[Tuple[int, int]]:
+        cs = self.cell_size
+        for cx in range(int(box[0] // cs), int(box[2] // cs) + 1):
+            for cy in range(int(box[1] // cs), int(box[3] // cs) + 1):
+                yield cx, cy
+
+    def query(self, box: Box) -> List[int]:
+        """Ids of words whose bounding box intersects `box`, in reading order."""
+        found = set()
+        for cell in self._cells_for(box):
+            for i in self.cells.get(cell, ()):
+                b = self.boxes[i]
+                if b[0] <= box[2] and b[2] >= box[0] and b[1] <= box[3] and b[3] >= box[1]:
+                    found.add(i)
+        return sorted(found, key=lambda i: (self.boxes[i][1], self.boxes[i][0]))
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = " ".join(w["text"] for w in self.words)
+        return self._text
+
+    def may_contain(self, label: str) -> bool:
+        """False if some word of the label cannot occur on this page (cheap, no index needed)."""
+        if self._lower is None:
+            self._lower = self.text().lower()
+        return all(token in self._lower for token in _label_tokens(label))
+
+    def _group_lines(self) -> None:
+        boxes = self.boxes
+        # Words in order of vertical centre; a word starts a new line unless it
+        # overlaps the first word of the current one (_vertical_overlap, inlined).
+        order = sorted(range(len(boxes)), key=lambda i: (boxes[i][1] + boxes[i][3], boxes[i][0]))
+        lines: List[List[int]] = []
+        line, top, bottom = None, 0.0, 0.0
+        for i in order:
+            b = boxes[i]
+            if line is not None and min(bottom, b[3]) - max(top, b[1]) > 0.5 * min(bottom - top, b[3] - b[1]):
+                line.append(i)
+            else:
+                line, top, bottom = [i], b[1], b[3]
+                lines.append(line)
+        line_of: List[Tuple[int, int]] = [(0, 0)] * len(boxes)
+        for n, line in enumerate(lines):
+            line.sort(key=lambda i: boxes[i][0])
+            for k, i in enumerate(line):
+                line_of[i] = (n, k)
+        self._lines, self._line_of = lines, line_of
+
+    def _right_neighbour(self, i: int) -> Optional[int]:
+        """The nearest word to the right of word i on its line, within max_distance."""
+        if i in self._next_word:
+            return self._next_word[i]
+        if self._lines is None:
+            self._group_lines()
+        n, k = self._line_of[i]
+        boxes, box, found = self.boxes, self.boxes[i], None
+        for j in self._lines[n][k + 1:]:
+            candidate = boxes[j]
+            if candidate[0] > box[2] + self.max_distance:
+                break
+            if candidate[0] >= box[2] - 0.5 and _vertical_overlap(candidate, box):
+                found = j
+                break
+        self._next_word[i] = found
+        return found
+
+    def _step(self, i: int, max_gap: float) -> Optional[int]:
+        """The word right after word i on its line, if the gap is at most max_gap."""
+        j = self._right_neighbour(i)
+        if j is None:
+            return None
+        boxes = self.boxes
+        return None if boxes[j][0] - boxes[i][2] > max_gap else j
+
+    def _run_from(self, first: int, max_gap: float) -> str:
+        """Words on the same line starting at `first`, up to the first wide gap."""
+        ids = [first]
+        nxt = self._step(first, max_gap)
+        while nxt is not None:
+            ids.append(nxt)
+            nxt = self._step(nxt, max_gap)
+        return " ".join(self.words[i]["text"] for i in ids)
+
+    def find_label(self, label: str, max_gap: float = 12.0) -> Iterator[Tuple[Box, int]]:
+        """Bounding box and last word id of every occurrence of the (multi-word) label."""
+        if not self.may_contain(label):
+            return
+        tokens = _label_tokens(label)
+        for start in self.by_text.get(tokens[0], ()):
+            box, last = self.boxes[start], start
+            for token in tokens[1:]:
+                nxt = self._step(last, max_gap)
+                if nxt is None or _norm(self.words[nxt]["text"]) != token:
+                    break
+                b = self.boxes[nxt]
+                box, last = (box[0], min(box[1], b[1]), b[2], max(box[3], b[3])), nxt
+            else:
+                yield box, last
+
+    def right_of(self, label: str, max_distance: Optional[float] = None, max_gap: float = 12.0) -> Optional[str]:
+        """Text on the same line to the right of the label, up to the first wide gap."""
+        max_distance = min(max_distance or self.max_distance, self.max_distance)
+        for _, last in self.find_label(label):
+            first = self._step(last, max_distance)
+            if first is not None:
+                return self._run_from(first, max_gap)
+        return None
+
+    def below(self, label: str, max_distance: float = 30.0, max_gap: float = 12.0) -> Optional[str]:
+        """Text on the nearest line under the label, starting within its horizontal span."""
+        for box, _ in self.find_label(label):
+            height = box[3] - box[1]
+            candidates = [
+                i for i in self.query((box[0] - height, box[3], box[2], box[3] + max_distance))
+                if self.boxes[i][1] >= box[3] - 0.5 * height
+            ]
+            if candidates:
+                return self._run_from(candidates[0], max_gap)
+        return None
+
+    def lookup(self, label: str, direction: str) -> Optional[str]:
+        return self.right_of(label) if direction == "right" else self.below(label)
+
+
+def build_page_indexes(path) -> List[PageIndex]:
+    """Index the words of every page of a PDF."""
+    indexes = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            try:
+                index = PageIndex.from_page(page)
+            except Exception:
+                # fall back to an empty page if extraction fails
+                index = PageIndex([])
+            finally:
+                release_page(page)
+            indexes.append(index)
+    return indexes
+
+
+def _clean_value(field: str, value: str) -> Optional[str]:
+    value = value.lstrip(":$ ").strip()
+    if not value:
+        return None
+    if field == "card_last4":
+        m = re.search(r"\b(\d{4})\b", value)
+        return m.group(1) if m else None
+    if field == "cardholder_name":
+        # same cleanup as pdf_parser._extract_cardholder_name
+        return re.sub(r"\s+(LLC|INC|CORP|LTD).*", "", value, flags=re.IGNORECASE)[:50]
+    if field == "statement_period":
+        return value[:100]
+    if field == "payment_due_date":
+        return parse_date(value[:40])
+    if field == "new_balance":
+        m = re.search(r"([\d,]{1,20}\.\d{2})", value)
+        return f"${m.group(1)}" if m else None
+    return value
+
+
+def extract_fields_from_layout(indexes: List[PageIndex], fields=None) -> Dict[str, Optional[str]]:
+    # fields limits the lookup to a subset of FIELDS; the rest are left None.
+    res = dict.fromkeys(FIELDS)
+    if fields is None or "issuer" in fields:
+        res["issuer"] = detect_issuer(" ".join(index.text() for index in indexes))
+    for field, labels in LAYOUT_LABELS.items():
+        if fields is not None and field not in fields:
+            continue
+        for index in indexes:
+            for label, direction in labels:
+                value = index.lookup(label, direction)
+                if value is not None:
+                    res[field] = _clean_value(field, value)
+                    if res[field] is not None:
+                        break
+            if res[field] is not None:
+                break
+    return res
+
+
+def parse_pdf_layout(path) -> Dict[str, Optional[str]]:
+    """parse_pdf, with fields the regex rules miss looked up by layout.
+
+    Word boxes are only extracted, and pages only indexed, when the regex
+    path leaves a field empty, so statements it parses fully cost no more
+    than parse_pdf.
+    """
+    res = parse_pdf(path)
+    missing = [k for k, v in res.items() if v is None]
+    if missing:
+        found = extract_fields_from_layout(build_page_indexes(path), missing)
+        for k in missing:
+            res[k] = found[k]
+    return res
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        out = parse_pdf_layout(sys.argv[1])
+        for k, v in out.items():
+            print(f"{k}: {v}")
+    else:
+        print("Usage: python spatial_index.py <file.pdf>")
@@ -0,0 +1,198 @@
+"""
+Extracted Text Store
+
+Caches the per-page text pdfplumber extracts from each statement, so that a
+change to the field rules in pdf_parser.py can be re-applied to a whole
+archive without opening a single PDF again. Text extraction is nearly all of
+the cost of parse_pdf; re-running extract_fields_from_text over cached text
+is a small fraction of it.
+
+Entries are keyed by the SHA-256 of the PDF bytes (a renamed or duplicated
+file is extracted once) and stored as zlib-compressed JSON, one file per
+document, under two-character shard directories:
+
+    <root>/ab/ab12...ef.json.z  ->  {"version": 1, "source": "name.pdf", "pages": [...]}
+
+Writes go to a temporary file first and are renamed into place, so several
+processes can fill the same store.
+
+Like the statements themselves, the store holds full statement text: keep it
+local and out of version control.
+
+Usage:
+    python text_store.py cache .text_store statements/*.pdf [--workers N]
+    python text_store.py reprocess .text_store [--output results.csv]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from pdf_parser import FIELDS, document_hash, extract_fields_from_text, extract_pages_from_pdf
+
+
+DEFAULT_STORE_PATH = ".text_store"
+STORE_VERSION = 1
+SUFFIX = ".json.z"
+
+
+class TextStore:
+    """Content-addressed, compressed store of extracted page text."""
+
+    def __init__(self, root: str = DEFAULT_STORE_PATH, level: int = 6):
+        self.root = root
+        self.level = level
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + SUFFIX)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def __iter__(self) -> Iterator[str]:
+        for shard in sorted(os.listdir(self.root)):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in sorted(os.listdir(shard_dir)):
+                if name.endswith(SUFFIX):
+                    yield name[:-len(SUFFIX)]
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def load(self, key: str) -> Optional[dict]:
+        """The stored entry ({"source", "pages", ...}), or None if missing or unreadable."""
+        try:
+            with open(self._path(key), "rb") as f:
+                entry = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except (OSError, ValueError, zlib.error):
+            return None
+        return entry if entry.get("version") == STORE_VERSION else None
+
+    def get(self, key: str) -> Optional[List[str]]:
+        entry = self.load(key)
+        return entry["pages"] if entry else None
+
+    def put(self, key: str, pages: Sequence[str], source: Optional[str] = None) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps({"version": STORE_VERSION, "source": source, "pages": list(pages)})
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(payload.encode("utf-8"), self.level))
+        os.replace(tmp, path)
+
+    def pages_for(self, path: str, workers: Optional[int] = None) -> Tuple[str, List[str]]:
+        """(key, pages) for a PDF on disk, extracting and storing it on a miss."""
+        with open(path, "rb") as f:
+            key = document_hash(f.read())
+        pages = self.get(key)
+        if pages is None:
+            pages = extract_pages_from_pdf(path, workers)
+            self.put(key, pages, source=os.path.basename(path))
+        return key, pages
+
+    def parse_pdf(self, path: str, stats=None, workers: Optional[int] = None) -> dict:
+        """Same result as pdf_parser.parse_pdf, reusing cached text when present."""
+        _, pages = self.pages_for(path, workers)
+        return extract_fields_from_text("\n".join(pages), stats)
+
+
+def _cache_one(root: str, path: str) -> bool:
+    store = TextStore(root)
+    with open(path, "rb") as f:
+        key = document_hash(f.read())
+    # Not just `key in store`: an unreadable or old-version entry is re-extracted.
+    if store.get(key) is not None:
+        return False
+    store.put(key, extract_pages_from_pdf(path), source=os.path.basename(path))
+    return True
+
+
+def _count_cached(paths: Sequence[str], futures: list, counts: dict) -> None:
+    for path, future in zip(paths, futures):
+        try:
+            counts["extracted" if future.result() else "cached"] += 1
+        except Exception as e:
+            counts["errors"] += 1
+            print(f"[ERROR] {path}: {e}", file=sys.stderr)
+
+
+def cache(store: TextStore, paths: Sequence[str], workers: Optional[int] = None, scheduler=None) -> dict:
+    """Extract and store every PDF not already in the store.
+
+    Each worker hashes, extracts and writes its own documents, so no page
+    text is sent back to the parent process. With a scheduler.ParseScheduler,
+    the documents are queued on its workers as "bulk" work instead.
+    """
+    counts = {"extracted": 0, "cached": 0, "errors": 0}
+    if scheduler is not None:
+        futures = [scheduler.call(_cache_one, store.root, path, priority="bulk") for path in paths]
+        _count_cached(paths, futures, counts)
+        return counts
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_cache_one, store.root, path) for path in paths]
+        _count_cached(paths, futures, counts)
+    return counts
+
+
+def reprocess(store: TextStore, keys: Optional[Sequence[str]] = None, stats=None) -> Iterator[dict]:
+    """Re-run field extraction over cached text; yields records with "filename" and "key"."""
+    for key in (keys if keys is not None else store):
+        entry = store.load(key)
+        if entry is None:
+            print(f"[SKIP] {key}: unreadable or from another store version; run cache again "
+                  f"on its PDF to re-extract it", file=sys.stderr)
+            continue
+        record = {"filename": entry.get("source"), "key": key}
+        record.update(extract_fields_from_text("\n".join(entry["pages"]), stats))
+        yield record
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compressed store of extracted statement text")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    c = sub.add_parser("cache", help="Extract text from PDFs not yet in the store")
+    c.add_argument("store")
+    c.add_argument("pdfs", nargs="+")
+    c.add_argument("--workers", type=int, default=None)
+
+    r = sub.add_parser("reprocess", help="Re-run field extraction over all cached text")
+    r.add_argument("store")
+    r.add_argument("--output", help="Write results to this CSV file instead of stdout")
+
+    args = ap.parse_args()
+    store = TextStore(args.store)
+
+    if args.command == "cache":
+        counts = cache(store, args.pdfs, workers=args.workers)
+        print(f"Extracted {counts['extracted']}, already cached {counts['cached']}, "
+              f"{counts['errors']} errors")
+        return
+
+    columns = ["filename"] + list(FIELDS) + ["key"]
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=columns)
+        writer.writeheader()
+        count = 0
+        for record in reprocess(store):
+            writer.writerow(record)
+            count += 1
+    finally:
+        if args.output:
+            out.close()
+    print(f"Reprocessed {count} documents", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()